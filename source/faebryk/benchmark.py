@@ -0,0 +1,440 @@
+"""
+Benchmarks for the kicad pcb tooling in library/.
+
+Run from source/faebryk, e.g.:
+    python benchmark.py synthesize --scale 100
+    python benchmark.py load
+"""
+
+import gc
+import logging
+import re
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import typer
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+app = typer.Typer()
+
+BASE_BOARD = Path(__file__).parent.parent.joinpath("kicad/main/main.kicad_pcb")
+BENCH_DIR = Path("./build/benchmark")
+SYNTHETIC_BOARD = BENCH_DIR.joinpath("synthetic.kicad_pcb")
+# ~100k footprints, vias & segments
+LARGE_BOARD = BENCH_DIR.joinpath("synthetic_100k.kicad_pcb")
+LARGE_SCALE = 117
+_ITEM_KINDS = ("footprint", "via", "segment")
+
+# top level forms of a kicad_pcb file start at an indent of two spaces
+_TOP_LEVEL = re.compile(r"^  \(", re.MULTILINE)
+_REF = re.compile(r'(\(fp_text reference "[^"]*)"')
+_COORD = re.compile(r"\((at|start|end) (-?[\d.]+) (-?[\d.]+)")
+
+
+def _split_top_level(text: str) -> Tuple[str, List[str], str]:
+    starts = [m.start() for m in _TOP_LEVEL.finditer(text)]
+    end = text.rindex(")")
+    forms = [text[s:e] for s, e in zip(starts, starts[1:] + [end])]
+    return text[: starts[0]], forms, text[end:]
+
+
+def _shift(form: str, dx: float, suffix: str) -> str:
+    form = _REF.sub(lambda m: f'{m.group(1)}#{suffix}"', form)
+    # only the first coordinate of a footprint is absolute
+    count = 1 if form.startswith("  (footprint") else 0
+    return _COORD.sub(
+        lambda m: f"({m.group(1)} {round(float(m.group(2)) + dx, 4)} {m.group(3)}",
+        form,
+        count=count,
+    )
+
+
+def make_synthetic_board(scale: int, path: Path = SYNTHETIC_BOARD) -> Path:
+    """
+    Replicates the footprints, vias and segments of the main board `scale` times
+    next to each other, keeping KiCad's formatting.
+    """
+
+    head, forms, tail = _split_top_level(BASE_BOARD.read_text(encoding="utf-8"))
+    kinds = tuple(f"  ({k}" for k in _ITEM_KINDS)
+
+    out = [head, *forms]
+    for i in range(1, scale):
+        out.extend(
+            _shift(form, dx=60 * i, suffix=str(i))
+            for form in forms
+            if form.startswith(kinds)
+        )
+    out.append(tail)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("".join(out), encoding="utf-8")
+    return path
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KiB, macos bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _load_sexpdata(path: Path):
+    import sexpdata
+
+    return sexpdata.loads(path.read_text(encoding="utf-8"))
+
+
+def _load_sexp(path: Path):
+    from library import sexp
+
+    return sexp.load(path)
+
+
+def _load_sexp_lazy(path: Path):
+    from library import sexp
+
+    # the unparsed bodies keep the mapping alive
+    return sexp.loads_lazy(sexp.map_file(path))
+
+
+LOADERS: Dict[str, Callable[[Path], object]] = {
+    "sexpdata": _load_sexpdata,
+    "sexp": _load_sexp,
+    "sexp-lazy": _load_sexp_lazy,
+}
+
+
+def _measure_load(loader: str, path: Path) -> Tuple[float, float]:
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    tree = LOADERS[loader](path)
+    duration = time.perf_counter() - start
+    peak = _peak_rss_mb() - baseline
+    del tree
+    return duration, peak
+
+
+def _in_fresh_process(func: Callable, *args):
+    # peak rss is per process, so every measurement gets its own
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(func, *args).result()
+
+
+def transform_workload(pcb) -> None:
+    """
+    The PCB side of main.transform_pcb & PCB_Transformer without the faebryk
+    graph: attach, cleanup, set_dimensions, move_fp, relabel & reposition.
+    """
+    from library.kicadpcb import At, FP_Text, Line
+
+    font = (1 / 8, 1 / 8, 0.15 / 8)
+
+    # attach
+    footprints = {(f.reference.text, f.name): f for f in pcb.footprints}
+
+    # cleanup
+    for via in pcb.vias:
+        if via.size_drill == (0.46, 0.2):
+            via.delete()
+    for text in pcb.text:
+        if text.text.endswith("_FBRK_AUTO"):
+            text.delete()
+
+    # set_dimensions
+    for line in pcb.select("gr_line", Line):
+        if line.layer.node[1] == "Edge.Cuts":
+            line.delete()
+
+    # move_fp
+    for i, fp in enumerate(footprints.values()):
+        if any(filter(lambda x: x.text == "FBRK:notouch", fp.user_text)):
+            continue
+        fp.at.coord = (13 + i % 20 * 3, 2.5 + i // 20 * 3.25, 90 * (i % 4))
+        if any(filter(lambda x: x.text == "FBRK:autoplaced", fp.user_text)):
+            continue
+        fp.append(
+            FP_Text.factory(
+                text="FBRK:autoplaced",
+                at=At.factory((0, 0, 0)),
+                font=font,
+                tstamp=str(i),
+                layer="User.5",
+            )
+        )
+
+    # rename, resize, relayer text
+    for f in footprints.values():
+        f.reference.layer = "User.8"
+        f.reference.at.coord = (0, 0, 0)
+        f.reference.font = (0.5, 0.5, 0.075)
+        user_text = next(
+            filter(lambda x: not x.text.startswith("FBRK:"), f.user_text), None
+        )
+        if user_text is None:
+            continue
+        user_text.layer = "User.7"
+        user_text.font = font
+
+    # reposition silkscreen text
+    for f in footprints.values():
+        rot = f.at.coord[2]
+        user_text = next(
+            filter(lambda x: not x.text.startswith("FBRK:"), f.user_text), None
+        )
+        if user_text is None:
+            continue
+        user_text.at.coord = (0, -2 if rot in [180, 270] else 2, rot)
+
+
+def _measure_transform(loader: str, path: Path) -> Tuple[float, int]:
+    from library.kicadpcb import PCB, Node
+
+    pcb = PCB(LOADERS[loader](path))
+    # like main.main
+    gc.collect()
+    gc.freeze()
+
+    wrappers = 0
+    init = Node.__init__
+
+    def counting_init(self, node):
+        nonlocal wrappers
+        wrappers += 1
+        init(self, node)
+
+    Node.__init__ = counting_init
+    try:
+        start = time.perf_counter()
+        transform_workload(pcb)
+        duration = time.perf_counter() - start
+    finally:
+        Node.__init__ = init
+        gc.unfreeze()
+
+    return duration, wrappers
+
+
+def _dump_sexpdata(pcb, path: Path) -> None:
+    # PCB.dump before the incremental serializer
+    import sexpdata
+
+    def remove_empty(x):
+        if isinstance(x, (list, tuple)):
+            rec = map(remove_empty, x)
+            return [o for o in rec if (o is not None) and (o not in [[], tuple()])]
+        return x
+
+    path.write_text(sexpdata.dumps(remove_empty(pcb.node)), encoding="utf-8")
+
+
+def _dump_sexp_join(pcb, path: Path) -> None:
+    # PCB.dump before streaming: the whole file is joined in memory first
+    from library import sexp
+
+    sexp.compact(pcb.node)
+    path.write_bytes(sexp.dumps(pcb.node, pcb.source))
+
+
+def _dump_sexp(pcb, path: Path) -> None:
+    pcb.dump(path)
+
+
+DUMPERS: Dict[str, Callable] = {
+    "sexpdata": _dump_sexpdata,
+    "sexp-join": _dump_sexp_join,
+    "sexp": _dump_sexp,
+}
+
+
+def _measure_dump(dumper: str, path: Path, trace: bool = False) -> float:
+    """
+    Wall time of the dump, or with trace the peak of python allocations in MB.
+    """
+    from library.kicadpcb import PCB
+
+    pcb = PCB.load(path)
+    transform_workload(pcb)
+    # worst case for tombstones: every via on the board gets cleaned up
+    for via in pcb.vias:
+        via.delete()
+
+    out = BENCH_DIR.joinpath(f"dump_{dumper}.kicad_pcb")
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    DUMPERS[dumper](pcb, out)
+    duration = time.perf_counter() - start
+    if not trace:
+        return duration
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+@app.command()
+def synthesize(scale: int = 100, out: Path = SYNTHETIC_BOARD):
+    path = make_synthetic_board(scale, out)
+    logger.info(f"Wrote {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+
+@app.command()
+def load(board: Path = SYNTHETIC_BOARD, runs: int = 3):
+    if not board.exists():
+        make_synthetic_board(100, board)
+
+    print(f"{board} ({board.stat().st_size / 1e6:.1f} MB)")
+    for loader in LOADERS:
+        results = [_in_fresh_process(_measure_load, loader, board) for _ in range(runs)]
+        duration = min(r[0] for r in results)
+        peak = max(r[1] for r in results)
+        print(f"{loader:>12}: {duration:7.3f} s  peak rss +{peak:7.1f} MB")
+
+
+@app.command()
+def transform(board: Path = SYNTHETIC_BOARD, runs: int = 3):
+    """
+    sexpdata trees are plain lists: linear scans & a new wrapper per access.
+    sexp trees are head indexed and memoize their wrappers.
+    """
+    if not board.exists():
+        make_synthetic_board(100, board)
+
+    print(f"{board} ({board.stat().st_size / 1e6:.1f} MB)")
+    for loader in LOADERS:
+        results = [_measure_transform(loader, board) for _ in range(runs)]
+        duration = min(r[0] for r in results)
+        print(f"{loader:>12}: {duration:7.3f} s  {results[0][1]:9d} wrappers")
+
+
+@app.command()
+def dump(board: Path = SYNTHETIC_BOARD, runs: int = 3):
+    if not board.exists():
+        make_synthetic_board(100, board)
+
+    print(f"{board} ({board.stat().st_size / 1e6:.1f} MB)")
+    for dumper in DUMPERS:
+        duration = min(_measure_dump(dumper, board) for _ in range(runs))
+        peak = _measure_dump(dumper, board, trace=True)
+        print(f"{dumper:>12}: {duration:7.3f} s  peak alloc {peak:7.1f} MB")
+
+
+@app.command()
+def cache(board: Path = SYNTHETIC_BOARD, runs: int = 3):
+    import shutil
+
+    from library.kicadpcb import PCB
+
+    if not board.exists():
+        make_synthetic_board(100, board)
+
+    cache_dir = BENCH_DIR.joinpath("cache")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def timed(**kwargs) -> float:
+        start = time.perf_counter()
+        PCB.load(board, **kwargs)
+        return time.perf_counter() - start
+
+    print(f"{board} ({board.stat().st_size / 1e6:.1f} MB)")
+    print(f"{'parse':>12}: {min(timed() for _ in range(runs)):7.3f} s")
+    print(f"{'cold cache':>12}: {timed(cache_dir=cache_dir):7.3f} s")
+    warm = min(timed(cache_dir=cache_dir) for _ in range(runs))
+    print(f"{'warm cache':>12}: {warm:7.3f} s")
+
+
+@app.command()
+def drc(board: Path = SYNTHETIC_BOARD, runs: int = 3):
+    from collections import Counter
+
+    from library import drc as drc_
+    from library.kicadpcb import PCB
+    from library.pcbutil import NetIndex, SpatialIndex
+
+    if not board.exists():
+        make_synthetic_board(100, board)
+
+    pcb = PCB.load(board)
+    print(f"{board} ({board.stat().st_size / 1e6:.1f} MB)")
+
+    def timed(func: Callable):
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            out = func()
+            durations.append(time.perf_counter() - start)
+        return min(durations), out
+
+    duration, index = timed(lambda: SpatialIndex.from_pcb(pcb))
+    print(f"{'index':>12}: {duration:7.3f} s")
+    nets = NetIndex.from_pcb(pcb)
+    duration, violations = timed(lambda: drc_.check(pcb, index=index, nets=nets))
+    kinds = Counter(v.kind for v in violations)
+    print(f"{'check':>12}: {duration:7.3f} s  {dict(kinds)}")
+
+
+@app.command()
+def ratsnest(board: Path = SYNTHETIC_BOARD, runs: int = 3):
+    from library.kicadpcb import PCB
+    from library.pcbutil import Ratsnest
+
+    if not board.exists():
+        make_synthetic_board(100, board)
+
+    pcb = PCB.load(board)
+    print(f"{board} ({board.stat().st_size / 1e6:.1f} MB)")
+
+    start = time.perf_counter()
+    nest = Ratsnest.from_pcb(pcb)
+    print(f"{'build':>12}: {time.perf_counter() - start:7.3f} s")
+
+    coords = nest.coords()
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        total = nest.total(coords)
+        durations.append(time.perf_counter() - start)
+    print(
+        f"{'lengths':>12}: {min(durations):7.3f} s  {total:.2f} mm"
+        f" over {len(nest.nets)} nets, {len(nest.pad_fp)} pads"
+    )
+
+
+@app.command()
+def parallel(board: Path = LARGE_BOARD, workers: str = "1,2,4,8", runs: int = 3):
+    from library import sexp
+
+    if not board.exists():
+        make_synthetic_board(LARGE_SCALE, board)
+
+    buf = sexp.map_file(board)
+    serial = sexp.loads(buf)
+    items = sum(
+        1 for form in serial if isinstance(form, list) and str(form[0]) in _ITEM_KINDS
+    )
+    print(f"{board} ({board.stat().st_size / 1e6:.1f} MB, {items} items)")
+
+    for count in map(int, workers.split(",")):
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            tree = sexp.loads_parallel(buf, count)
+            durations.append(time.perf_counter() - start)
+        same = tree == serial and sexp._spans(tree) == sexp._spans(serial)
+        # capped at the number of cores, 1 is the serial parser
+        used = sexp.worker_count(count)
+        print(
+            f"{count:>4} workers ({used} used): {min(durations):7.3f} s"
+            f"  identical: {same}"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -208,90 +208,85 @@ class Tester(Component):
                 connect_diffpair_to_tester_pair(cable_pair, tester_pair)
 
 
-def pick_component(cmp: Component):
-    def _find_partno() -> str | None:
-        if isinstance(cmp, USB_C_Receptacle):
-            return "C134092"
-
-        if isinstance(cmp, RJ45_Receptacle):
-            return "C138392"
-
-        if isinstance(cmp, Resistor):
-            cmp.add_trait(has_symmetric_footprint_pinmap())
-
-            resistors = {
-                "C137885": Constant(300),
-                "C226726": Constant(5.1 * K),
-                "C25741": Constant(100 * K),
-                "C11702": Constant(1 * K),
-            }
-
-            for partno, resistance in resistors.items():
-                if (
-                    isinstance(cmp.resistance, Constant)
-                    and cmp.resistance.value == resistance.value
-                ):
-                    return partno
-                if (
-                    isinstance(cmp.resistance, Range)
-                    and resistance.value >= cmp.resistance.min
-                    and resistance.value <= cmp.resistance.max
-                ):
-                    cmp.set_resistance(resistance)
-                    return partno
-
-            raise Exception(
-                f"Could not find fitting resistor for value: {cmp.resistance}"
-            )
-
-        if isinstance(cmp, LED):
-            cmp.add_trait(
-                has_defined_footprint_pinmap(
-                    {
-                        "1": cmp.IFs.anode,
-                        "2": cmp.IFs.cathode,
-                    }
-                )
+def find_partno(cmp: Component) -> str | None:
+    """
+    LCSC part number for cmp, adds the traits that come with the part.
+    """
+    if isinstance(cmp, USB_C_Receptacle):
+        return "C134092"
+
+    if isinstance(cmp, RJ45_Receptacle):
+        return "C138392"
+
+    if isinstance(cmp, Resistor):
+        cmp.add_trait(has_symmetric_footprint_pinmap())
+
+        resistors = {
+            "C137885": Constant(300),
+            "C226726": Constant(5.1 * K),
+            "C25741": Constant(100 * K),
+            "C11702": Constant(1 * K),
+        }
+
+        for partno, resistance in resistors.items():
+            if (
+                isinstance(cmp.resistance, Constant)
+                and cmp.resistance.value == resistance.value
+            ):
+                return partno
+            if (
+                isinstance(cmp.resistance, Range)
+                and resistance.value >= cmp.resistance.min
+                and resistance.value <= cmp.resistance.max
+            ):
+                cmp.set_resistance(resistance)
+                return partno
+
+        raise Exception(f"Could not find fitting resistor for value: {cmp.resistance}")
+
+    if isinstance(cmp, LED):
+        cmp.add_trait(
+            has_defined_footprint_pinmap(
+                {
+                    "1": cmp.IFs.anode,
+                    "2": cmp.IFs.cathode,
+                }
             )
+        )
 
-            return "C84256"
-
-        if isinstance(cmp, MOSFET):
-            cmp.add_trait(
-                has_defined_footprint_pinmap(
-                    {
-                        "2": cmp.IFs.source,
-                        "3": cmp.IFs.drain,
-                        "1": cmp.IFs.gate,
-                    }
-                )
-            )
+        return "C84256"
 
-            mosfets = {
-                "C8545": (
-                    MOSFET.ChannelType.N_CHANNEL,
-                    MOSFET.SaturationType.ENHANCEMENT,
-                ),
-                "C8492": (
-                    MOSFET.ChannelType.P_CHANNEL,
-                    MOSFET.SaturationType.ENHANCEMENT,
-                ),
-            }
-
-            for partno, (channel_type, sat_type) in mosfets.items():
-                if cmp.channel_type == channel_type and cmp.saturation_type == sat_type:
-                    return partno
-
-            raise Exception(
-                f"Could not find fitting mosfet for: {cmp.channel_type, cmp.saturation_type}"
+    if isinstance(cmp, MOSFET):
+        cmp.add_trait(
+            has_defined_footprint_pinmap(
+                {
+                    "2": cmp.IFs.source,
+                    "3": cmp.IFs.drain,
+                    "1": cmp.IFs.gate,
+                }
             )
+        )
 
-        return None
+        mosfets = {
+            "C8545": (
+                MOSFET.ChannelType.N_CHANNEL,
+                MOSFET.SaturationType.ENHANCEMENT,
+            ),
+            "C8492": (
+                MOSFET.ChannelType.P_CHANNEL,
+                MOSFET.SaturationType.ENHANCEMENT,
+            ),
+        }
+
+        for partno, (channel_type, sat_type) in mosfets.items():
+            if cmp.channel_type == channel_type and cmp.saturation_type == sat_type:
+                return partno
+
+        raise Exception(
+            f"Could not find fitting mosfet for: {cmp.channel_type, cmp.saturation_type}"
+        )
 
-    partno = _find_partno()
-    if partno is None:
-        return
-    lcsc.attach_footprint(cmp, partno)
+    return None
 
 
 class Cable_Tester(Component):
@@ -339,9 +334,12 @@ class Cable_Tester(Component):
             if isinstance(cmp, MOSFET):
                 cmp.add_trait(has_defined_type_description("Q"))
 
-        # footprints
-        for cmp in cmps:
-            pick_component(cmp)
+        # footprints, download the missing parts in parallel first
+        partnos = [(cmp, find_partno(cmp)) for cmp in cmps]
+        lcsc.prefetch(partno for _, partno in partnos if partno is not None)
+        for cmp, partno in partnos:
+            if partno is not None:
+                lcsc.attach_footprint(cmp, partno)
 
         # hack footprints
         for r in get_all_components(self) + [self]:
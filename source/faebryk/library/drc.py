@@ -0,0 +1,159 @@
+# TODO should be part of faebryk
+
+import logging
+import math
+from typing import List, NamedTuple, Optional, Tuple
+
+from library.kicadpcb import PCB, Footprint, Pad, Via
+from library.pcbutil import NetIndex, SpatialIndex
+
+logger = logging.getLogger(__name__)
+
+# coordinates are given in 0.1um or coarser, exactly clearance apart is fine
+_EPS = 1e-6
+
+
+class Violation(NamedTuple):
+    # footprint: overlapping footprint boxes
+    # pad: pads of different footprints & nets closer than the clearance
+    # via: vias closer than the clearance
+    # via_pad: via closer than the clearance to a pad of another net
+    kind: str
+    a: SpatialIndex.Item
+    b: SpatialIndex.Item
+    # distance between the two, negative if they overlap
+    gap: float
+    # footprints of a & b if they are pads
+    owners: Tuple[Optional[Footprint], Optional[Footprint]] = (None, None)
+
+    def __str__(self) -> str:
+        a, b = (_name(x, owner) for x, owner in zip((self.a, self.b), self.owners))
+        return f"{self.kind}: {a} <-> {b} gap {self.gap:.3f}"
+
+
+def _name(item: SpatialIndex.Item, owner: Optional[Footprint] = None) -> str:
+    if isinstance(item, Footprint):
+        return item.reference.text
+    if isinstance(item, Pad):
+        if owner is None:
+            return f"pad {item.name}"
+        return f"{owner.reference.text} pad {item.name}"
+    x, y = item.at.coord[:2]
+    return f"via ({x}, {y})"
+
+
+def _box_gap(a: SpatialIndex.Box, b: SpatialIndex.Box) -> float:
+    dx = max(b[0] - a[2], a[0] - b[2])
+    dy = max(b[1] - a[3], a[1] - b[3])
+    if dx < 0 and dy < 0:
+        # overlapping, by the smaller depth
+        return max(dx, dy)
+    return math.hypot(max(dx, 0), max(dy, 0))
+
+
+def _via_circle(via: Via):
+    x, y = via.at.coord[:2]
+    return x, y, via.size_drill[0] / 2
+
+
+def _grow(box: SpatialIndex.Box, by: float) -> SpatialIndex.Box:
+    return box[0] - by, box[1] - by, box[2] + by, box[3] + by
+
+
+def check(
+    pcb: PCB,
+    clearance: float = 0.2,
+    index: Optional[SpatialIndex] = None,
+    nets: Optional[NetIndex] = None,
+) -> List[Violation]:
+    """
+    Pre-check for overlapping footprints and pads & vias closer than
+    clearance, on bounding boxes (Pad.size) & via circles (Via.size_drill).
+    Every item only looks at the grid cells around it, so this is close to
+    linear in the number of items. Pass the indexes of a PCB_Transformer to
+    reuse them.
+    """
+    if index is None:
+        index = SpatialIndex.from_pcb(pcb)
+    if nets is None:
+        nets = NetIndex.from_pcb(pcb)
+
+    out: List[Violation] = []
+    boxes = index.boxes
+
+    def pairs(item, box, kinds):
+        # every pair once
+        key = id(item.node)
+        for other in index.query(box, kinds):
+            other_key = id(other.node)
+            if other_key > key or type(other) is not type(item):
+                yield other
+
+    footprints, pads, vias = [], [], []
+    for item in index.items.values():
+        if isinstance(item, Footprint):
+            footprints.append(item)
+        elif isinstance(item, Pad):
+            pads.append(item)
+        else:
+            vias.append(item)
+
+    # graphics only footprints (logos, ...) may lie on top of anything
+    for fp in footprints:
+        if not index.pads_of(fp):
+            continue
+        box = boxes[id(fp.node)]
+        for other in pairs(fp, box, (Footprint,)):
+            if not index.pads_of(other):
+                continue
+            gap = _box_gap(box, boxes[id(other.node)])
+            if gap < -_EPS:
+                out.append(Violation("footprint", fp, other, gap))
+
+    for pad in pads:
+        key = id(pad.node)
+        box = boxes[key]
+        net = nets.net_of(pad)
+        owner = index.owner_of(pad)
+        for other in pairs(pad, _grow(box, clearance), (Pad,)):
+            other_owner = index.owner_of(other)
+            if other_owner is owner:
+                continue
+            if net is not None and nets.net_of(other) == net:
+                continue
+            gap = _box_gap(box, boxes[id(other.node)])
+            if gap < clearance - _EPS:
+                out.append(Violation("pad", pad, other, gap, (owner, other_owner)))
+
+    for via in vias:
+        x, y, r = _via_circle(via)
+        net = via.net
+        box = _grow(boxes[id(via.node)], clearance)
+        for other in pairs(via, box, (Via, Pad)):
+            if isinstance(other, Via):
+                ox, oy, orad = _via_circle(other)
+                gap = math.hypot(x - ox, y - oy) - r - orad
+                if gap < clearance - _EPS:
+                    out.append(Violation("via", via, other, gap))
+                continue
+            if nets.net_of(other) == net:
+                continue
+            gap = _box_gap((x, y, x, y), boxes[id(other.node)]) - r
+            if gap < clearance - _EPS:
+                owners = (None, index.owner_of(other))
+                out.append(Violation("via_pad", via, other, gap, owners))
+
+    return out
+
+
+def report(violations: List[Violation]) -> bool:
+    """
+    Log violations, True if there were none.
+    """
+    for violation in violations:
+        logger.warning(violation)
+    if violations:
+        logger.warning(f"DRC pre-check: {len(violations)} violations")
+    else:
+        logger.info("DRC pre-check: no violations")
+    return not violations
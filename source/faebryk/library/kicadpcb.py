@@ -1,20 +1,79 @@
 # TODO should be part of faebryk
 
 from pathlib import Path
-from typing import Any, Callable, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
 
-import sexpdata
+from library import sexp
+from library.sexp import SexpList
 from sexpdata import Symbol
 
+T = TypeVar("T", bound="Node")
+
 
 class Node:
+    __slots__ = ("node",)
+
     def __init__(self, node) -> None:
         assert isinstance(node, list)
         self.node = node
 
     @classmethod
     def from_node(cls, node: "Node"):
-        return cls(node.node)
+        return cls.view(node.node)
+
+    @classmethod
+    def view(cls, node: list):
+        """
+        Wrapper of node, created once per parsed node until the node changes.
+        """
+        if not isinstance(node, SexpList):
+            return cls(node)
+        memo = node.memo
+        if memo is None:
+            memo = node.memo = {}
+        out = memo.get(cls)
+        if out is None:
+            out = memo[cls] = cls(node)
+        return out
+
+    def get_views(self, cls: Type[T], key: str) -> List[T]:
+        """
+        Children with head key wrapped in cls.
+        Memoized like view, so do not mutate the returned list.
+        """
+        node = self.node
+        if not isinstance(node, SexpList):
+            head = Symbol(key)
+            return [cls(n) for n in node if isinstance(n, list) and n[:1] == [head]]
+        memo = node.memo
+        if memo is None:
+            memo = node.memo = {}
+        out = memo.get((cls, key))
+        if out is None:
+            out = memo[(cls, key)] = [cls.view(n) for n in node.by_head(key)]
+        return out
+
+    def select(self, path: str, cls: Optional[Type[T]] = None) -> List[T]:
+        """
+        Descendants matching a selector like footprint/fp_text[reference],
+        the last step wrapped in cls (Node by default).
+        See sexp.compile_selector for the syntax.
+        """
+        steps = sexp.compile_selector(path)
+        nodes = [self]
+        last = len(steps) - 1
+        for i, (head, arg) in enumerate(steps):
+            view = cls if cls is not None and i == last else Node
+            if arg is None:
+                nodes = [child for n in nodes for child in n.get_views(view, head)]
+                continue
+            nodes = [
+                child
+                for n in nodes
+                for child in n.get_views(view, head)
+                if child.node[1:2] == arg
+            ]
+        return nodes
 
     def get(self, key: List[Callable[[Any], bool]]) -> List["Node"]:
         result = [
@@ -30,80 +89,118 @@ class Node:
             return [sub for next_node in result for sub in next_node.get(key[1:])]
 
     def get_prop(self, key: str) -> List["Node"]:
-        return self.get([lambda n: len(n) > 0 and n[0] == Symbol(key)])
+        return self.select(key)
 
     def append(self, node: "Node"):
+        if isinstance(self.node, SexpList):
+            # make the new child indexable & aware of its parent
+            node.node = SexpList.adopt(node.node, self.node)
         self.node.append(node.node)
 
     def __str__(self) -> str:
         return str(self.node)
 
     def delete(self):
+        if isinstance(self.node, SexpList):
+            self.node.discard()
+            return
         self.node.clear()
         self.node.append(None)
 
 
 class PCB(Node):
+    # source: buffer the tree was parsed from, dump keeps unchanged parts of it
+    __slots__ = ("source",)
+
+    def __init__(self, node, source=None) -> None:
+        super().__init__(node)
+        self.source = source
+
     @property
     def footprints(self) -> List["Footprint"]:
-        return [Footprint.from_node(n) for n in self.get_prop("footprint")]
+        return list(self.get_views(Footprint, "footprint"))
 
     @property
     def vias(self) -> List["Via"]:
-        return [Via.from_node(n) for n in self.get_prop("via")]
+        return list(self.get_views(Via, "via"))
 
     @property
     def text(self) -> List["GR_Text"]:
-        return [GR_Text.from_node(n) for n in self.get_prop("gr_text")]
+        return list(self.get_views(GR_Text, "gr_text"))
 
     @property
     def segments(self) -> List["Node"]:
-        return [Node.from_node(n) for n in self.get_prop("segment")]
+        return list(self.get_views(Node, "segment"))
 
     @classmethod
-    def load(cls, path: Path):
-        return cls(sexpdata.loads(path.read_text(encoding="utf-8")))
+    def load(
+        cls,
+        path: Path,
+        cache_dir: Optional[Path] = None,
+        workers: int = 1,
+        lazy: bool = False,
+    ):
+        """
+        workers > 1 parses the top level forms of big boards in a process pool.
+        lazy leaves footprint bodies unparsed until they are accessed, this
+        does not go through the cache.
+        """
+        source = sexp.map_file(path)
+        if lazy:
+            return cls(sexp.loads_lazy(source), source)
+        if cache_dir is not None:
+            return cls(sexp.loads_cached(source, cache_dir, workers=workers), source)
+        if workers > 1:
+            return cls(sexp.loads_parallel(source, workers), source)
+        return cls(sexp.loads(source), source)
 
     def dump(self, path: Path):
-        def remove_empty(x):
-            if type(x) in [list, tuple]:
-                rec = map(remove_empty, x)
-                return [o for o in rec if (o is not None) and (o not in [[], tuple()])]
-            return x
-
-        cleaned = remove_empty(self.node)
-        pcbsexpout = sexpdata.dumps(cleaned)
-        return path.write_text(pcbsexpout, encoding="utf-8")
+        sexp.compact(self.node)
+        return sexp.dump(self.node, path, self.source)
 
 
 class Footprint(Node):
+    __slots__ = ()
+
     @property
     def reference(self) -> "FP_Text":
-        return FP_Text.from_node(
-            self.get([lambda n: n[0:2] == [Symbol("fp_text"), Symbol("reference")]])[0]
-        )
+        return self.select("fp_text[reference]", FP_Text)[0]
 
     @property
     def value(self) -> "FP_Text":
-        return FP_Text.from_node(
-            self.get([lambda n: n[0:2] == [Symbol("fp_text"), Symbol("value")]])[0]
-        )
+        return self.select("fp_text[value]", FP_Text)[0]
 
     @property
     def user_text(self) -> List["FP_Text"]:
-        return list(
-            map(
-                FP_Text.from_node,
-                self.get([lambda n: n[0:2] == [Symbol("fp_text"), Symbol("user")]]),
-            )
-        )
+        return self.select("fp_text[user]", FP_Text)
+
+    def pads_by_name(self) -> Dict[str, "Pad"]:
+        """
+        First pad per name, memoized like get_views.
+        """
+        node = self.node
+        memo = None
+        if isinstance(node, SexpList):
+            memo = node.memo
+            if memo is None:
+                memo = node.memo = {}
+            out = memo.get("pads_by_name")
+            if out is not None:
+                return out
+
+        out = {}
+        for pad in self.get_views(Pad, "pad"):
+            out.setdefault(pad.name, pad)
+        if memo is not None:
+            memo["pads_by_name"] = out
+        return out
 
     def get_pad(self, name: str) -> "Pad":
-        return Pad.from_node(self.get([lambda x: x[:2] == [Symbol("pad"), name]])[0])
+        return self.pads_by_name()[name]
 
     @property
     def at(self):
-        return At.from_node(self.get_prop("at")[0])
+        return self.get_views(At, "at")[0]
 
     @property
     def name(self) -> str:
@@ -111,9 +208,11 @@ class Footprint(Node):
 
 
 class Pad(Node):
+    __slots__ = ()
+
     @property
     def at(self):
-        return At.from_node(self.get_prop("at")[0])
+        return self.get_views(At, "at")[0]
 
     @property
     def name(self) -> str:
@@ -121,23 +220,32 @@ class Pad(Node):
 
     @property
     def net(self) -> str:
-        return self.get_prop("net")[0].node[1]
+        return self.get_views(Node, "net")[0].node[1]
 
     @property
     def size(self) -> Tuple[float, float]:
-        return tuple(self.get_prop("size")[0].node[1:3])
+        return tuple(self.get_views(Node, "size")[0].node[1:3])
 
 
 class Via(Node):
+    __slots__ = ()
+
     Dimensions = Tuple[float, float]
 
     @property
     def at(self):
-        return At.from_node(self.get_prop("at")[0])
+        return self.get_views(At, "at")[0]
+
+    @property
+    def net(self) -> int:
+        return self.get_views(Node, "net")[0].node[1]
 
     @property
     def size_drill(self):
-        return (self.get_prop("size")[0].node[1], self.get_prop("drill")[0].node[1])
+        return (
+            self.get_views(Node, "size")[0].node[1],
+            self.get_views(Node, "drill")[0].node[1],
+        )
 
     @classmethod
     def factory(
@@ -162,9 +270,13 @@ class Via(Node):
 
 
 class Line(Node):
+    __slots__ = ()
+
     Coord = Tuple[float, float]
 
     class Stroke(Node):
+        __slots__ = ()
+
         @classmethod
         def factory(cls, width_mm: float, type: str):
             return cls(
@@ -177,7 +289,7 @@ class Line(Node):
 
     @property
     def layer(self) -> Node:
-        return self.get_prop("layer")[0]
+        return self.get_views(Node, "layer")[0]
 
     @classmethod
     def factory(cls, start: Coord, end: Coord, stroke: Stroke, layer: str, tstamp: str):
@@ -194,12 +306,14 @@ class Line(Node):
 
 
 class Text(Node):
+    __slots__ = ()
+
     Font = Tuple[float, float, float]
     TEXT_IDX = None
 
     @property
     def layer(self) -> Node:
-        return self.get_prop("layer")[0]
+        return self.get_views(Node, "layer")[0]
 
     @layer.setter
     def layer(self, value: str):
@@ -217,20 +331,24 @@ class Text(Node):
 
     @property
     def at(self):
-        return At.from_node(self.get_prop("at")[0])
+        return self.get_views(At, "at")[0]
+
+    def _font(self) -> Node:
+        return self.select("effects/font")[0]
 
     @property
     def font(self) -> Font:
-        font = self.get_prop("effects")[0].get_prop("font")[0]
+        font = self._font()
         return (
-            font.get_prop("size")[0].node[1:3] + font.get_prop("thickness")[0].node[1]
+            *font.get_views(Node, "size")[0].node[1:3],
+            font.get_views(Node, "thickness")[0].node[1],
         )
 
     @font.setter
     def font(self, value: Font):
-        font = self.get_prop("effects")[0].get_prop("font")[0]
-        font.get_prop("size")[0].node[1:3] = value[0:2]
-        font.get_prop("thickness")[0].node[1] = value[2]
+        font = self._font()
+        font.get_views(Node, "size")[0].node[1:3] = value[0:2]
+        font.get_views(Node, "thickness")[0].node[1] = value[2]
 
     def __repr__(self) -> str:
         return f"Text[{self.node}]"
@@ -260,6 +378,8 @@ class Text(Node):
 
 
 class FP_Text(Text):
+    __slots__ = ()
+
     TEXT_IDX = 2
 
     @property
@@ -274,6 +394,8 @@ class FP_Text(Text):
 
 
 class GR_Text(Text):
+    __slots__ = ()
+
     TEXT_IDX = 1
 
     @classmethod
@@ -282,6 +404,8 @@ class GR_Text(Text):
 
 
 class At(Node):
+    __slots__ = ()
+
     Coord = Tuple[float, float, float] | Tuple[float, float]
 
     @property
@@ -5,7 +5,10 @@ import logging
 logger = logging.getLogger(__name__)
 
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable, List, Optional
 
 from easyeda2kicad.easyeda.easyeda_api import EasyedaApi
 from easyeda2kicad.easyeda.easyeda_importer import (
@@ -22,24 +25,70 @@ from faebryk.library.trait_impl.component import (
 )
 from faebryk.library.traits.component import has_descriptive_properties
 
-
-def attach_footprint(component: Component, partno: str, get_model: bool = True):
-    # TODO dont hardcode relative paths
-
-    # easyeda api access & caching --------------------------------------------
+# TODO dont hardcode relative paths
+CACHE_BASE = Path("./build/cache/easyeda")
+
+
+def _cache_path(partno: str) -> Path:
+    CACHE_BASE.mkdir(parents=True, exist_ok=True)
+    return CACHE_BASE.joinpath(partno)
+
+
+def fetch(partno: str, api: Optional[EasyedaApi] = None) -> Optional[Path]:
+    """
+    Download the cad data of partno into the cache, unless it is there.
+    None if the api returned no data, that is not cached so the next call
+    tries again.
+    """
+    comp_path = _cache_path(partno)
+    if comp_path.exists():
+        return comp_path
+
+    logger.debug(f"Did not find component {partno} in cache, downloading...")
+    if api is None:
+        api = EasyedaApi()
+    cad_data = api.get_cad_data_of_component(lcsc_id=partno)
+    if not cad_data:
+        return None
+    serialized = json.dumps(cad_data)
+    # other fetches of the same part may be running, never expose half a file
+    tmp_path = comp_path.with_name(f".{partno}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(serialized)
+    tmp_path.replace(comp_path)
+    return comp_path
+
+
+def prefetch(partnos: Iterable[str], workers: int = 8) -> List[str]:
+    """
+    Download the cad data of all distinct partnos missing from the cache,
+    up to workers at a time. Returns the partnos that failed, attach_footprint
+    retries them one by one.
+    """
+    missing = sorted({partno for partno in partnos if not _cache_path(partno).exists()})
+    if not missing:
+        return []
+
+    logger.info(f"Downloading {len(missing)} parts from EasyEDA")
+    # the api keeps no per request state, so the threads can share it
     api = EasyedaApi()
 
-    cache_base = Path("./build/cache/easyeda")
-    cache_base.mkdir(parents=True, exist_ok=True)
+    def _fetch(partno: str) -> Optional[str]:
+        try:
+            if fetch(partno, api) is not None:
+                return None
+            logger.warning(f"Failed to prefetch {partno}: no data")
+        except Exception as e:
+            logger.warning(f"Failed to prefetch {partno}: {e}")
+        return partno
 
-    comp_path = cache_base.joinpath(partno)
-    if not comp_path.exists():
-        logger.debug(f"Did not find component {partno} in cache, downloading...")
-        cad_data = api.get_cad_data_of_component(lcsc_id=partno)
-        serialized = json.dumps(cad_data)
-        comp_path.write_text(serialized)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(missing)))) as pool:
+        return [partno for partno in pool.map(_fetch, missing) if partno is not None]
 
-    data = json.loads(comp_path.read_text())
+
+def attach_footprint(component: Component, partno: str, get_model: bool = True):
+    # easyeda api access & caching --------------------------------------------
+    comp_path = fetch(partno)
+    data = json.loads(comp_path.read_text()) if comp_path is not None else None
 
     # API returned no data
     if not data:
@@ -0,0 +1,294 @@
+# TODO should be part of faebryk
+
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+from library import sexp
+from library.kicadpcb import PCB, Footprint, FP_Text, Node
+from library.sexp import SexpList
+from sexpdata import Symbol
+
+logger = logging.getLogger(__name__)
+
+_TSTAMP = Symbol("tstamp")
+# compared separately by _diff_footprint
+_FOOTPRINT_PROPS = {Symbol("at"), Symbol("fp_text"), _TSTAMP}
+
+
+class Change(NamedTuple):
+    # footprint, fp_text, via, gr_text, ... (head of the changed form)
+    kind: str
+    # added, removed, moved or edited
+    action: str
+    # what changed: reference, via position, text, edited property, ...
+    key: Any
+    old: Any = None
+    new: Any = None
+
+
+def _freeze(x) -> Hashable:
+    """
+    Hashable copy of a subtree without tstamps & deleted nodes,
+    faebryk regenerates the tstamps of everything it inserts.
+    """
+    if not isinstance(x, list):
+        return x
+    return tuple(
+        _freeze(child)
+        for child in x
+        if not sexp._is_empty(child)
+        and not (isinstance(child, list) and child[:1] == [_TSTAMP])
+    )
+
+
+def _same_source(old: PCB, new: PCB) -> bool:
+    if old.source is None or new.source is None:
+        return False
+    if old.source is new.source:
+        return True
+    return memoryview(old.source) == memoryview(new.source)
+
+
+def _unchanged(old: list, new: list, same_source: bool) -> bool:
+    # a clean node parsed from the same bytes as old is old
+    return (
+        same_source
+        and isinstance(new, SexpList)
+        and isinstance(old, SexpList)
+        and not new.dirty
+        and new.start == old.start
+        and new.end == old.end
+    )
+
+
+def _multiset_diff(
+    old: Iterable[list], new: Iterable[list], same_source: bool
+) -> Tuple[List[list], List[list]]:
+    """
+    Removed & added nodes, ignoring order & tstamps.
+    Spans are compared first, only the rest is frozen.
+    """
+
+    def span(x):
+        if not isinstance(x, SexpList) or x.dirty or x.start < 0:
+            return None
+        return x.start, x.end
+
+    by_span: Dict[Tuple[int, int], list] = {}
+    rest_old = []
+    for x in old:
+        s = span(x) if same_source else None
+        if s is None:
+            rest_old.append(x)
+        else:
+            by_span[s] = x
+
+    rest_new = []
+    for x in new:
+        s = span(x) if same_source else None
+        if s is not None and by_span.pop(s, None) is not None:
+            continue
+        rest_new.append(x)
+    rest_old.extend(by_span.values())
+
+    frozen: Dict[Hashable, List[list]] = defaultdict(list)
+    for x in rest_old:
+        frozen[_freeze(x)].append(x)
+    added = []
+    for x in rest_new:
+        matches = frozen.get(_freeze(x))
+        if matches:
+            matches.pop()
+        else:
+            added.append(x)
+    removed = [x for xs in frozen.values() for x in xs]
+    return removed, added
+
+
+def _label(node: list) -> Any:
+    # short description of an added/removed top level form
+    head = str(node[0])
+    wrapped = Node(node)
+    if head == "via":
+        return (wrapped.select("at")[0].node[1:3], wrapped.select("net")[0].node[1])
+    if head == "gr_text":
+        return node[1]
+    return head
+
+
+def _footprint_key(fp: Footprint) -> Tuple[Optional[str], str]:
+    tstamps = fp.select("tstamp")
+    return (tstamps[0].node[1] if tstamps else None), fp.reference.text
+
+
+def _match_footprints(
+    old: List[Footprint], new: List[Footprint]
+) -> Tuple[List[Tuple[Footprint, Footprint]], List[Footprint], List[Footprint]]:
+    # by tstamp & reference, then by either of them
+    keys = [
+        lambda k: k,
+        lambda k: (k[0], None) if k[0] is not None else None,
+        lambda k: (None, k[1]),
+    ]
+    old_keys = [_footprint_key(fp) for fp in old]
+    new_keys = [_footprint_key(fp) for fp in new]
+
+    pairs = []
+    left_old = list(range(len(old)))
+    left_new = list(range(len(new)))
+    for key in keys:
+        candidates: Dict[Any, List[int]] = defaultdict(list)
+        for i in reversed(left_old):
+            k = key(old_keys[i])
+            if k is not None:
+                candidates[k].append(i)
+        unmatched = []
+        for j in left_new:
+            k = key(new_keys[j])
+            found = candidates.get(k) if k is not None else None
+            if not found:
+                unmatched.append(j)
+                continue
+            pairs.append((old[found.pop()], new[j]))
+        matched = {id(a.node) for a, _ in pairs}
+        left_old = [i for i in left_old if id(old[i].node) not in matched]
+        left_new = unmatched
+
+    return pairs, [old[i] for i in left_old], [new[j] for j in left_new]
+
+
+def _text_key(text: FP_Text):
+    # reference & value exist once, user texts are told apart by content
+    if text.text_type == "user":
+        return "user", text.text
+    return text.text_type, None
+
+
+_TEXT_PROPS = [
+    ("text", lambda t: t.text),
+    ("at", lambda t: t.at.coord),
+    ("layer", lambda t: t.layer.node[1]),
+    ("font", lambda t: t.font),
+]
+
+
+def _diff_footprint(
+    old: Footprint, new: Footprint, ref: str, same_source: bool
+) -> List[Change]:
+    out = []
+
+    old_at, new_at = old.at.coord, new.at.coord
+    if old_at != new_at:
+        out.append(Change("footprint", "moved", ref, old_at, new_at))
+
+    # atoms like the footprint name or locked
+    old_atoms = [x for x in old.node if not isinstance(x, list)]
+    new_atoms = [x for x in new.node if not isinstance(x, list)]
+    if old_atoms != new_atoms:
+        out.append(Change("footprint", "edited", ref, old_atoms, new_atoms))
+
+    # texts, whole subtrees as a multiset per key, so identical user texts
+    # count twice & edits of any property (hide, justify, ...) show up
+    old_texts: Dict[Any, List[FP_Text]] = defaultdict(list)
+    new_texts: Dict[Any, List[FP_Text]] = defaultdict(list)
+    for texts, fp in [(old_texts, old), (new_texts, new)]:
+        for t in fp.select("fp_text", FP_Text):
+            texts[_text_key(t)].append(t)
+
+    for key in sorted(old_texts.keys() | new_texts.keys(), key=str):
+        name = f"fp_text[{key[0]}]" if key[1] is None else f"fp_text[{key[1]!r}]"
+        removed, added = _multiset_diff(
+            [t.node for t in old_texts.get(key, [])],
+            [t.node for t in new_texts.get(key, [])],
+            same_source,
+        )
+        for a, b in zip(removed, added):
+            a, b = FP_Text(a), FP_Text(b)
+            edited = False
+            for prop, value in _TEXT_PROPS:
+                va, vb = value(a), value(b)
+                if va != vb:
+                    edited = True
+                    out.append(
+                        Change("footprint", "edited", (ref, f"{name}/{prop}"), va, vb)
+                    )
+            if not edited:
+                out.append(Change("footprint", "edited", (ref, name)))
+        for a in removed[len(added) :]:
+            out.append(Change("fp_text", "removed", (ref, name), FP_Text(a).text, None))
+        for b in added[len(removed) :]:
+            out.append(Change("fp_text", "added", (ref, name), None, FP_Text(b).text))
+
+    # everything else, by head
+    def rest(fp: Footprint) -> Dict[str, List[list]]:
+        heads = defaultdict(list)
+        for child in fp.node:
+            if not isinstance(child, list) or sexp._is_empty(child):
+                continue
+            if child[0] in _FOOTPRINT_PROPS:
+                continue
+            heads[str(child[0])].append(child)
+        return heads
+
+    old_rest, new_rest = rest(old), rest(new)
+    for head in sorted(old_rest.keys() | new_rest.keys()):
+        a, b = old_rest.get(head, []), new_rest.get(head, [])
+        removed, added = _multiset_diff(a, b, same_source)
+        if removed or added:
+            out.append(Change("footprint", "edited", (ref, head), len(a), len(b)))
+
+    return out
+
+
+def diff(old: PCB, new: PCB) -> List[Change]:
+    """
+    What changed from old to new, e.g. the board on disk & the transformed
+    one. Footprints are matched by tstamp & reference, all other top level
+    forms by content (ignoring tstamps). Nodes that are still clean & come
+    from the same source bytes are not compared, so diffing a freshly
+    transformed board against the file it was loaded from is close to linear.
+    """
+    same_source = _same_source(old, new)
+    root = new.node
+    if (
+        same_source
+        and isinstance(root, SexpList)
+        and not root.dirty
+        and not getattr(root, "journal", None)
+    ):
+        return []
+
+    out: List[Change] = []
+
+    # footprints
+    pairs, removed, added = _match_footprints(old.footprints, new.footprints)
+    for fp in removed:
+        out.append(Change("footprint", "removed", fp.reference.text))
+    for fp in added:
+        out.append(Change("footprint", "added", fp.reference.text))
+    for a, b in pairs:
+        if _unchanged(a.node, b.node, same_source):
+            continue
+        out.extend(_diff_footprint(a, b, b.reference.text, same_source))
+
+    # everything else
+    def others(pcb: PCB) -> Dict[str, List[list]]:
+        heads = defaultdict(list)
+        for child in pcb.node:
+            if not isinstance(child, list) or sexp._is_empty(child):
+                continue
+            if child[0] == Symbol("footprint"):
+                continue
+            heads[str(child[0])].append(child)
+        return heads
+
+    old_others, new_others = others(old), others(new)
+    for head in sorted(old_others.keys() | new_others.keys()):
+        removed, added = _multiset_diff(
+            old_others.get(head, []), new_others.get(head, []), same_source
+        )
+        out.extend(Change(head, "removed", _label(x)) for x in removed)
+        out.extend(Change(head, "added", _label(x)) for x in added)
+
+    return out
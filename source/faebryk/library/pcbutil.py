@@ -2,8 +2,22 @@ import itertools
 import logging
 import math
 import random
+import re
+import uuid
+from collections import defaultdict
 from operator import add
-from typing import Any, Dict, List, Tuple, TypeVar
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 import numpy as np
 from faebryk.library.core import Component, ComponentTrait, FaebrykLibObject, Interface
@@ -14,11 +28,1392 @@ from faebryk.library.traits.component import (
     has_overriden_name,
 )
 from faebryk.library.util import get_all_components
-from library.kicadpcb import PCB, At, Footprint, FP_Text, GR_Text, Line, Pad, Via
+from library import sexp
+from library.kicadpcb import (
+    PCB,
+    At,
+    Footprint,
+    FP_Text,
+    GR_Text,
+    Line,
+    Node,
+    Pad,
+    Text,
+    Via,
+)
+from library.sexp import SexpList
+from sexpdata import Symbol
 
 logger = logging.getLogger(__name__)
 
 
+class FootprintTable:
+    """
+    Columnar view of footprints for vectorized placement.
+    Change x, y & rot and write them back with PCB_Transformer.move_table.
+    """
+
+    def __init__(self, footprints: List[Footprint]) -> None:
+        self.footprints = footprints
+
+        self.reference = np.array([fp.reference.text for fp in footprints], dtype=str)
+        self.name = np.array([fp.name for fp in footprints], dtype=str)
+
+        coords = np.array([fp.at.coord for fp in footprints], dtype=float)
+        coords = coords.reshape(len(footprints), 3)
+        self._placed = coords
+        self.x = coords[:, 0].copy()
+        self.y = coords[:, 1].copy()
+        self.rot = coords[:, 2].copy()
+
+        markers = [{t.text for t in fp.user_text} for fp in footprints]
+        self.notouch = np.array(["FBRK:notouch" in m for m in markers], dtype=bool)
+        self.autoplaced = np.array(
+            ["FBRK:autoplaced" in m for m in markers], dtype=bool
+        )
+
+    @classmethod
+    def from_pcb(cls, pcb: PCB) -> "FootprintTable":
+        return cls(pcb.footprints)
+
+    def __len__(self) -> int:
+        return len(self.footprints)
+
+    def index(self, reference: str) -> int:
+        return int(np.flatnonzero(self.reference == reference)[0])
+
+    @property
+    def coords(self) -> np.ndarray:
+        return np.column_stack((self.x, self.y, self.rot))
+
+    @property
+    def moved(self) -> np.ndarray:
+        return np.any(self.coords != self._placed, axis=1)
+
+
+class SpatialIndex:
+    """
+    Uniform grid over the axis aligned bounding boxes of footprints,
+    their pads & vias.
+    Items are keyed by their parsed node, so wrappers of the same node are
+    interchangeable.
+    """
+
+    # xmin, ymin, xmax, ymax
+    Box = Tuple[float, float, float, float]
+    Item = Footprint | Pad | Via
+
+    def __init__(self, cell_size: float = 2.5) -> None:
+        self.cell_size = cell_size
+
+        self.items: Dict[int, SpatialIndex.Item] = {}
+        self.boxes: Dict[int, SpatialIndex.Box] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        # cell range that ever held items, only grows
+        self._extent: Optional[Tuple[int, int, int, int]] = None
+        # footprint -> its pads & pad -> its footprint, pads move with them
+        self._pads: Dict[int, List[Pad]] = {}
+        self._owner: Dict[int, int] = {}
+        # graphics do not change when moving, so only read them once
+        self._outlines: Dict[int, Optional[SpatialIndex.Box]] = {}
+
+    @classmethod
+    def from_pcb(cls, pcb: PCB, cell_size: float = 2.5) -> "SpatialIndex":
+        out = cls(cell_size)
+        out.insert_footprints(pcb.footprints)
+        for via in pcb.vias:
+            out.insert(via, cls.via_box(via))
+        return out
+
+    # Boxes -------------------------------------------------------------------
+    @staticmethod
+    def _extents(sizes: np.ndarray, rots: np.ndarray) -> np.ndarray:
+        # half width & height of (N, 2) sizes rotated by rots degrees
+        w, h = sizes[:, 0] / 2, sizes[:, 1] / 2
+        rad = np.radians(rots)
+        c, s = np.abs(np.cos(rad)), np.abs(np.sin(rad))
+        return np.column_stack((w * c + h * s, w * s + h * c))
+
+    @staticmethod
+    def _bounds(points: Iterable[Tuple[float, float]]) -> Box:
+        xs, ys = zip(*points)
+        return min(xs), min(ys), max(xs), max(ys)
+
+    @classmethod
+    def pad_boxes(cls, parents, pads: List[Pad]) -> np.ndarray:
+        """
+        (N, 4) boxes of pads, parents holds the footprint coord of every pad
+        (or one for all).
+        """
+        if not pads:
+            return np.empty((0, 4))
+        coords = np.array([pad.at.coord for pad in pads], dtype=float)
+        centers = PCB_Transformer.Geometry.abs_pos_array(parents, coords)
+        return cls._pad_boxes(centers, pads, coords[:, 2])
+
+    @classmethod
+    def _pad_boxes(cls, centers: np.ndarray, pads: List[Pad], rots) -> np.ndarray:
+        sizes = np.array([pad.size for pad in pads], dtype=float).reshape(-1, 2)
+        # pad rotation is stored absolute
+        extents = cls._extents(sizes, rots)
+        return np.hstack((centers[:, :2] - extents, centers[:, :2] + extents))
+
+    @classmethod
+    def pad_box(cls, fp: Footprint, pad: Pad) -> Box:
+        return tuple(cls.pad_boxes(fp.at.coord, [pad])[0].tolist())
+
+    @staticmethod
+    def via_box(via: Via) -> Box:
+        x, y = via.at.coord[:2]
+        r = via.size_drill[0] / 2
+        return x - r, y - r, x + r, y + r
+
+    _POINTS = [[Symbol("start")], [Symbol("mid")], [Symbol("end")]]
+    _LAYER = [Symbol("layer")]
+
+    @classmethod
+    def outline_box(cls, fp: Footprint, layer: Optional[str] = None) -> Optional[Box]:
+        """
+        Bounds of the graphic items of fp (on layer only if given) in its
+        own frame.
+        """
+
+        def graphics(key: str) -> List[Node]:
+            if layer is None:
+                return fp.select(key)
+            # compare the cheap string first, symbols compare slowly
+            return [
+                g
+                for g in fp.select(key)
+                if any(
+                    isinstance(child, list)
+                    and child[1:2] == [layer]
+                    and child[:1] == cls._LAYER
+                    for child in g.node
+                )
+            ]
+
+        points = []
+        for key in ["fp_line", "fp_rect", "fp_arc"]:
+            for graphic in graphics(key):
+                # one pass over the children instead of a lookup per point
+                points.extend(
+                    tuple(child[1:3])
+                    for child in graphic.node
+                    if isinstance(child, list) and child[:1] in cls._POINTS
+                )
+        for circle in graphics("fp_circle"):
+            cx, cy = circle.select("center")[0].node[1:3]
+            ex, ey = circle.select("end")[0].node[1:3]
+            r = math.hypot(ex - cx, ey - cy)
+            points.extend(
+                [(cx - r, cy - r), (cx - r, cy + r), (cx + r, cy - r), (cx + r, cy + r)]
+            )
+        for poly in graphics("fp_poly"):
+            points.extend(tuple(xy.node[1:3]) for xy in poly.select("pts/xy"))
+
+        if not points:
+            return None
+        return cls._bounds(points)
+
+    @classmethod
+    def footprint_box(
+        cls,
+        fp: Footprint,
+        pads: Optional[List[Box]] = None,
+        outline: Optional[Box] = None,
+    ) -> Box:
+        """
+        Union of the pads & the graphic outline of fp.
+        """
+        if pads is None:
+            pads = cls.pad_boxes(fp.at.coord, fp.get_views(Pad, "pad")).tolist()
+        if outline is None:
+            outline = cls.outline_box(fp)
+
+        at = fp.at.coord
+        corners = []
+        if outline is not None:
+            corners = PCB_Transformer.Geometry.abs_pos_array(
+                at, cls._corners(outline)
+            ).tolist()
+        return cls._union(at, pads, corners)
+
+    @staticmethod
+    def _corners(box: Box) -> List[Tuple[float, float]]:
+        xmin, ymin, xmax, ymax = box
+        return [(xmin, ymin), (xmin, ymax), (xmax, ymin), (xmax, ymax)]
+
+    @classmethod
+    def _union(cls, at: At.Coord, pads: Iterable[Box], corners: Iterable) -> Box:
+        # bounds of the origin, pad boxes & absolute outline corners
+        points = [at[:2]]
+        points.extend(corner[:2] for corner in corners)
+        for xmin, ymin, xmax, ymax in pads:
+            points.extend([(xmin, ymin), (xmax, ymax)])
+        return cls._bounds(points)
+
+    # Updates -----------------------------------------------------------------
+    def _cell_range(self, box: Box):
+        cs = self.cell_size
+        return itertools.product(
+            range(math.floor(box[0] / cs), math.floor(box[2] / cs) + 1),
+            range(math.floor(box[1] / cs), math.floor(box[3] / cs) + 1),
+        )
+
+    def insert(self, item: Item, box: Box):
+        key = id(item.node)
+        if key in self.boxes:
+            self._unlink(key)
+        self.items[key] = item
+        self.boxes[key] = box
+        for cell in self._cell_range(box):
+            self._cells[cell].add(key)
+
+        cs = self.cell_size
+        lo = math.floor(box[0] / cs), math.floor(box[1] / cs)
+        hi = math.floor(box[2] / cs), math.floor(box[3] / cs)
+        if self._extent is None:
+            self._extent = (*lo, *hi)
+        else:
+            e = self._extent
+            self._extent = (
+                min(e[0], lo[0]),
+                min(e[1], lo[1]),
+                max(e[2], hi[0]),
+                max(e[3], hi[1]),
+            )
+
+    def _unlink(self, key: int):
+        for cell in self._cell_range(self.boxes[key]):
+            bucket = self._cells[cell]
+            bucket.discard(key)
+            if not bucket:
+                del self._cells[cell]
+
+    def remove(self, item: Item):
+        key = id(item.node)
+        if key not in self.boxes:
+            return
+        self._unlink(key)
+        del self.items[key]
+        del self.boxes[key]
+        for pad in self._pads.pop(key, []):
+            self.remove(pad)
+        self._owner.pop(key, None)
+        self._outlines.pop(key, None)
+
+    def insert_footprints(self, footprints: Iterable[Footprint]):
+        """
+        (Re-)index footprints and their pads, call again after moving them.
+        The pads & outlines of all footprints are placed in one pass.
+        """
+        footprints = list(footprints)
+        ats = [fp.at.coord for fp in footprints]
+
+        # pad centers & outline corners, transformed in one go
+        parents, points, pads, rots = [], [], [], []
+        corner_parents, corners = [], []
+        for fp, at in zip(footprints, ats):
+            key = id(fp.node)
+            fp_pads = self._pads.get(key)
+            if fp_pads is None:
+                fp_pads = self._pads[key] = list(fp.get_views(Pad, "pad"))
+                self._outlines[key] = self.outline_box(fp)
+            for pad in fp_pads:
+                x, y, rot = pad.at.coord
+                parents.append(at)
+                points.append((x, y))
+                rots.append(rot)
+            pads.extend(fp_pads)
+            outline = self._outlines[key]
+            if outline is not None:
+                corner_parents.extend([at] * 4)
+                corners.extend(self._corners(outline))
+
+        if not parents and not corner_parents:
+            abs_points = np.empty((0, 3))
+        else:
+            abs_points = PCB_Transformer.Geometry.abs_pos_array(
+                parents + corner_parents, points + corners
+            )
+        pad_boxes = self._pad_boxes(abs_points[: len(pads)], pads, rots).tolist()
+        abs_corners = abs_points[len(pads) :].tolist()
+
+        i = j = 0
+        for fp, at in zip(footprints, ats):
+            key = id(fp.node)
+            fp_pads = self._pads[key]
+            boxes = pad_boxes[i : i + len(fp_pads)]
+            i += len(fp_pads)
+            for pad, box in zip(fp_pads, boxes):
+                self.insert(pad, tuple(box))
+                self._owner[id(pad.node)] = key
+
+            fp_corners = []
+            if self._outlines[key] is not None:
+                fp_corners = abs_corners[j : j + 4]
+                j += 4
+            self.insert(fp, self._union(at, boxes, fp_corners))
+
+    def insert_footprint(self, fp: Footprint):
+        self.insert_footprints([fp])
+
+    update_footprint = insert_footprint
+
+    # Queries -----------------------------------------------------------------
+    def pads_of(self, fp: Footprint) -> List[Pad]:
+        """
+        Indexed pads of fp, empty for graphics only footprints.
+        """
+        return self._pads.get(id(fp.node), [])
+
+    def owner_of(self, pad: Pad) -> Optional[Footprint]:
+        key = self._owner.get(id(pad.node))
+        return None if key is None else self.items[key]
+
+    def _select(self, keys: Iterable[int], kinds: Optional[Tuple[Type, ...]]):
+        items = (self.items[k] for k in keys)
+        if kinds is None:
+            return list(items)
+        return [item for item in items if isinstance(item, kinds)]
+
+    def query(self, box: Box, kinds: Optional[Tuple[Type, ...]] = None) -> List[Item]:
+        """
+        Items whose boxes intersect box (touching counts).
+        """
+        found = set()
+        for cell in self._cell_range(box):
+            found.update(self._cells.get(cell, ()))
+        hits = [
+            k
+            for k in found
+            if self.boxes[k][0] <= box[2]
+            and box[0] <= self.boxes[k][2]
+            and self.boxes[k][1] <= box[3]
+            and box[1] <= self.boxes[k][3]
+        ]
+        return self._select(hits, kinds)
+
+    def overlaps(
+        self, item: Item, kinds: Optional[Tuple[Type, ...]] = None
+    ) -> List[Item]:
+        """
+        Items whose boxes overlap the one of item by more than their edges.
+        A footprint and its own pads never overlap.
+        """
+        key = id(item.node)
+        box = self.boxes[key]
+        owner = self._owner.get(key, key)
+        related = {owner, *(id(pad.node) for pad in self._pads.get(owner, ()))}
+
+        return [
+            other
+            for other in self.query(box, kinds)
+            if id(other.node) not in related
+            and self._overlap(box, self.boxes[id(other.node)])
+        ]
+
+    @staticmethod
+    def _overlap(a: Box, b: Box) -> bool:
+        return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+    @staticmethod
+    def distance(point: Tuple[float, float], box: Box) -> float:
+        dx = max(box[0] - point[0], 0, point[0] - box[2])
+        dy = max(box[1] - point[1], 0, point[1] - box[3])
+        return math.hypot(dx, dy)
+
+    def nearest(
+        self,
+        point: Tuple[float, float],
+        kinds: Optional[Tuple[Type, ...]] = None,
+        max_distance: float = math.inf,
+    ) -> Optional[Item]:
+        """
+        Item with the closest box to point, searching rings of cells around it.
+        """
+        if self._extent is None:
+            return None
+
+        cs = self.cell_size
+        cx, cy = math.floor(point[0] / cs), math.floor(point[1] / cs)
+        xmin, ymin, xmax, ymax = self._extent
+        # no cell further out than this holds anything
+        reach = max(cx - xmin, xmax - cx, cy - ymin, ymax - cy, 0)
+
+        best, best_dist = None, max_distance
+        seen = set()
+        for r in range(reach + 1):
+            # everything first found in ring r is at least (r-1) cells away
+            if (r - 1) * cs > best_dist:
+                break
+            for cell in self._ring(cx, cy, r):
+                for key in self._cells.get(cell, ()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    if kinds is not None and not isinstance(self.items[key], kinds):
+                        continue
+                    dist = self.distance(point, self.boxes[key])
+                    if dist < best_dist or best is None and dist <= best_dist:
+                        best, best_dist = self.items[key], dist
+        return best
+
+    @staticmethod
+    def _ring(cx: int, cy: int, r: int):
+        if r == 0:
+            yield cx, cy
+            return
+        for x in range(cx - r, cx + r + 1):
+            yield x, cy - r
+            yield x, cy + r
+        for y in range(cy - r + 1, cy + r):
+            yield cx - r, y
+            yield cx + r, y
+
+
+class NetIndex:
+    """
+    Net membership of pads, vias & segments, built in one pass over the board.
+    Nets are keyed by their number, names are resolved with number().
+    """
+
+    Item = Pad | Via | Node
+
+    def __init__(self) -> None:
+        self.names: Dict[int, str] = {}
+        self.numbers: Dict[str, int] = {}
+
+        self.pads: Dict[int, List[Pad]] = defaultdict(list)
+        self.vias: Dict[int, List[Via]] = defaultdict(list)
+        self.segments: Dict[int, List[Node]] = defaultdict(list)
+        # pad node -> net & footprint
+        self._pad_net: Dict[int, int] = {}
+        self._pad_fp: Dict[int, Footprint] = {}
+
+    @classmethod
+    def from_pcb(cls, pcb: PCB) -> "NetIndex":
+        out = cls()
+        for net in pcb.select("net"):
+            number, name = net.node[1:3]
+            out.names[number] = name
+            out.numbers[name] = number
+
+        for fp in pcb.footprints:
+            for pad in fp.get_views(Pad, "pad"):
+                net = cls._net(pad)
+                if net is None:
+                    continue
+                out.pads[net].append(pad)
+                out._pad_net[id(pad.node)] = net
+                out._pad_fp[id(pad.node)] = fp
+        for via in pcb.vias:
+            out.add_via(via)
+        for segment in pcb.segments:
+            net = cls._net(segment)
+            if net is not None:
+                out.segments[net].append(segment)
+        return out
+
+    _NET = [Symbol("net")]
+
+    @classmethod
+    def _net(cls, item: Item) -> Optional[int]:
+        # runs for every item on the board, skip memoizing wrappers
+        for child in item.node:
+            if isinstance(child, list) and child[:1] == cls._NET:
+                return child[1]
+        return None
+
+    def number(self, net: int | str) -> int:
+        return self.numbers[net] if isinstance(net, str) else net
+
+    def add_via(self, via: Via):
+        net = self._net(via)
+        if net is not None:
+            self.vias[net].append(via)
+
+    def remove_via(self, via: Via):
+        net = self._net(via)
+        if net in self.vias:
+            self.vias[net] = [v for v in self.vias[net] if v.node is not via.node]
+
+    def net_of(self, pad: Pad) -> Optional[int]:
+        return self._pad_net.get(id(pad.node))
+
+    def footprint_of(self, pad: Pad) -> Footprint:
+        return self._pad_fp[id(pad.node)]
+
+    def pads_of(self, net: int | str) -> List[Pad]:
+        return self.pads.get(self.number(net), [])
+
+    def vias_of(self, net: int | str) -> List[Via]:
+        return self.vias.get(self.number(net), [])
+
+    def segments_of(self, net: int | str) -> List[Node]:
+        return self.segments.get(self.number(net), [])
+
+    def members(
+        self, footprints: List[Footprint], max_net_size: Optional[int] = None
+    ) -> Dict[int, List[Tuple[int, Tuple[float, float]]]]:
+        """
+        Pads of every net that connects something, as the index of their
+        footprint in footprints & their offset from it. Pads of other
+        footprints are left out, so are net 0, nets with less than 2 pads
+        left & ones with more than max_net_size.
+        The cost models (PlacementOptimizer, Ratsnest) are built from this.
+        """
+        index = {id(fp.node): f for f, fp in enumerate(footprints)}
+        out = {}
+        for net, pads in self.pads.items():
+            if net == 0:
+                continue
+            found = []
+            for pad in pads:
+                f = index.get(id(self.footprint_of(pad).node))
+                if f is not None:
+                    found.append((f, pad.at.coord[:2]))
+            if len(found) < 2:
+                continue
+            if max_net_size is not None and len(found) > max_net_size:
+                continue
+            out[net] = found
+        return out
+
+
+class RowPacker:
+    """
+    Packs groups of footprints into rows (or columns) inside a bounding box.
+    Every footprint gets a clearance box (left, up, right, down) around its
+    origin, rotated with it. The footprints of a group sit next to each other
+    on a common center line. Groups go into a grid with per_line groups per
+    row, or shelf by shelf until the bounds are full.
+    Boxes of different footprints never overlap.
+    """
+
+    # left, up, right, down at rotation 0
+    Clearance = Tuple[float, float, float, float]
+    # footprint & its rotation
+    Item = Tuple[Footprint, int]
+
+    class Packing(NamedTuple):
+        moves: List[Tuple[Footprint, At.Coord]]
+        # clearance box per move
+        boxes: np.ndarray
+
+    def __init__(
+        self,
+        clearances: Optional[Dict[str, Clearance]] = None,
+        default: Clearance = (3, 3, 3, 3),
+    ) -> None:
+        # keyed by footprint name
+        self.clearances = clearances or {}
+        self.default = default
+
+    def clearance(self, fp: Footprint, rot: float) -> Clearance:
+        """
+        Clearance of fp rotated by rot degrees (counter clockwise like kicad).
+        """
+        c = tuple(self.clearances.get(fp.name, self.default))
+        if rot % 90 == 0:
+            k = int(rot // 90) % 4
+            return c[k:] + c[:k]
+
+        # bounds of the rotated box
+        corners = [(-c[0], -c[1]), (-c[0], c[3]), (c[2], -c[1]), (c[2], c[3])]
+        theta = np.radians(rot)
+        cos, sin = np.cos(theta), np.sin(theta)
+        xs = [x * cos + y * sin for x, y in corners]
+        ys = [-x * sin + y * cos for x, y in corners]
+        return -min(xs), -min(ys), max(xs), max(ys)
+
+    def pack(
+        self,
+        groups: List[Optional[List[Item]]],
+        bounds: SpatialIndex.Box,
+        per_line: Optional[int] = None,
+        gap: Tuple[float, float] = (0, 0),
+        vertical: bool = False,
+    ) -> Packing:
+        """
+        Coords for all footprints of groups, starting at the top left of
+        bounds. None groups leave their grid cell empty. gap is the extra
+        space between cells along & across the rows.
+        vertical packs columns (groups going down) instead of rows.
+        Raises ValueError if the groups do not fit into bounds.
+        """
+        clearances = [
+            [self.clearance(fp, rot) for fp, rot in group]
+            if group is not None
+            else None
+            for group in groups
+        ]
+        if vertical:
+            # pack the transposed problem as rows
+            bounds = (bounds[1], bounds[0], bounds[3], bounds[2])
+            clearances = [
+                [(u, l, d, r) for l, u, r, d in group] if group is not None else None
+                for group in clearances
+            ]
+
+        cells = self._cells(clearances, bounds, per_line, gap)
+
+        moves, boxes = [], []
+        for group, cs, (x, y, cell) in zip(groups, clearances, cells):
+            if group is None:
+                continue
+            for (fp, rot), (l, u, r, d) in zip(group, cs):
+                center = x + l
+                # clamped to the cell, so float error can not make
+                # neighbouring boxes overlap
+                box = (
+                    x,
+                    max(y - u, cell[1]),
+                    min(center + r, cell[2]),
+                    min(y + d, cell[3]),
+                )
+                at = (center, y)
+                if vertical:
+                    box = (box[1], box[0], box[3], box[2])
+                    at = (y, center)
+                moves.append((fp, (*at, rot)))
+                boxes.append(box)
+                x = center + r
+
+        return self.Packing(moves, np.array(boxes, dtype=float).reshape(-1, 4))
+
+    @staticmethod
+    def _cells(
+        clearances: List[Optional[List[Clearance]]],
+        bounds: SpatialIndex.Box,
+        per_line: Optional[int],
+        gap: Tuple[float, float],
+    ) -> List[Tuple[float, float, SpatialIndex.Box]]:
+        # left end, center line & cell of every group
+        sizes = [
+            (
+                sum(l + r for l, _, r, _ in cs),
+                max(u for _, u, _, _ in cs),
+                max(d for _, _, _, d in cs),
+            )
+            if cs
+            else (0, 0, 0)
+            for cs in clearances
+        ]
+        xmin, ymin, xmax, ymax = bounds
+
+        if per_line is not None:
+            # grid: columns as wide as their widest group, rows as high as
+            # their highest one
+            n_lines = -(-len(sizes) // per_line)
+            widths = [0.0] * per_line
+            ups, downs = [0.0] * n_lines, [0.0] * n_lines
+            for i, (w, u, d) in enumerate(sizes):
+                row, col = divmod(i, per_line)
+                widths[col] = max(widths[col], w)
+                ups[row] = max(ups[row], u)
+                downs[row] = max(downs[row], d)
+
+            lefts, rights = [], []
+            x = xmin
+            for w in widths:
+                lefts.append(x)
+                rights.append(x + w)
+                x = x + w + gap[0]
+            tops, bottoms = [], []
+            y = ymin
+            for u, d in zip(ups, downs):
+                tops.append(y)
+                bottoms.append(y + u + d)
+                y = y + u + d + gap[1]
+
+            right = max(rights, default=xmin)
+            bottom = max(bottoms, default=ymin)
+            if right > xmax or bottom > ymax:
+                raise ValueError(
+                    f"{len(sizes)} groups need {right - xmin:.2f} x "
+                    f"{bottom - ymin:.2f}, bounds are {xmax - xmin:.2f} x "
+                    f"{ymax - ymin:.2f}"
+                )
+
+            out = []
+            for i in range(len(sizes)):
+                row, col = divmod(i, per_line)
+                cell = (lefts[col], tops[row], rights[col], bottoms[row])
+                out.append((lefts[col], tops[row] + ups[row], cell))
+            return out
+
+        # shelves: fill a row left to right, start the next one below it
+        out = []
+        x, top, bottom = xmin, ymin, ymin
+        shelf: List[int] = []
+
+        def close(shelf: List[int], top: float) -> float:
+            up = max(sizes[i][1] for i in shelf)
+            down = max(sizes[i][2] for i in shelf)
+            bottom = top + up + down
+            for i in shelf:
+                left, _, right = out[i]
+                out[i] = (left, top + up, (left, top, right, bottom))
+            return bottom
+
+        for i, (w, _, _) in enumerate(sizes):
+            if w > xmax - xmin:
+                raise ValueError(f"group {i} is wider than the bounds ({w:.2f})")
+            if shelf and x + w > xmax:
+                bottom = close(shelf, top)
+                x, top, shelf = xmin, bottom + gap[1], []
+            out.append((x, 0.0, x + w))
+            shelf.append(i)
+            x = x + w + gap[0]
+        if shelf:
+            bottom = close(shelf, top)
+        if bottom > ymax:
+            raise ValueError(
+                f"{len(sizes)} groups need {bottom - ymin:.2f} rows of height, "
+                f"bounds are {ymax - ymin:.2f} high"
+            )
+        return out
+
+
+class LabelPlacer:
+    """
+    Places text labels around their anchors, e.g. channel names next to LEDs.
+    Every label has the same candidate offsets, tried in order. Candidates
+    overlapping pads or silkscreen (footprint graphics & texts) are dropped
+    first, then labels with the fewest free candidates pick first & later
+    ones avoid the labels placed before them.
+    Text boxes are estimated from the font, kicad centers them on their at.
+    """
+
+    # text & anchor
+    Label = Tuple[str, Tuple[float, float]]
+
+    class Placement(NamedTuple):
+        # at per label, in the order of the labels
+        ats: List[At]
+        boxes: np.ndarray
+        # labels without a free candidate, left at their first free one
+        # (or the first candidate)
+        crowded: List[int]
+
+    def __init__(
+        self,
+        offsets: List[Tuple[float, float]],
+        font: Text.Font,
+        clearance: float = 0.1,
+        layer: str = "F.SilkS",
+    ) -> None:
+        assert offsets, "need at least one candidate offset"
+        self.offsets = np.array(offsets, dtype=float).reshape(-1, 2)
+        self.font = font
+        self.clearance = clearance
+        self.layer = layer
+
+    @staticmethod
+    def extent(text: str, font: Text.Font) -> Tuple[float, float]:
+        """
+        Half width & height of text, stroke font glyphs are about as wide as
+        the font size.
+        """
+        lines = text.split("\n")
+        w, h, thickness = font
+        width = max(len(line) for line in lines) * w + thickness
+        height = len(lines) * h + thickness
+        return width / 2, height / 2
+
+    def candidates(self, labels: List[Label]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (L, C, 2) centers & (L, C, 4) boxes of the candidates of all labels.
+        """
+        anchors = np.array([anchor[:2] for _, anchor in labels], dtype=float)
+        halves = np.array(
+            [self.extent(text, self.font) for text, _ in labels], dtype=float
+        )
+        centers = anchors.reshape(-1, 1, 2) + self.offsets
+        halves = halves.reshape(-1, 1, 2)
+        return centers, np.concatenate((centers - halves, centers + halves), axis=2)
+
+    def reach(self, boxes: np.ndarray) -> np.ndarray:
+        """
+        (L, 4) bounds of the (L, C, 4) candidate boxes of every label, grown
+        by the clearance.
+        """
+        c = self.clearance
+        lo = boxes[:, :, :2].min(axis=1) - c
+        hi = boxes[:, :, 2:].max(axis=1) + c
+        return np.hstack((lo, hi)).reshape(-1, 4)
+
+    def silkscreen(
+        self,
+        footprints: Iterable[Footprint],
+        texts: Iterable[Text],
+        ignore: Iterable[str] = (),
+    ) -> SpatialIndex:
+        """
+        Index of the silkscreen on layer: footprints by the bounds of their
+        graphics & texts by their estimated boxes, except texts in ignore
+        (e.g. the labels of the last run).
+        """
+        out = SpatialIndex()
+        with_silk, corners = [], []
+        for fp in footprints:
+            box = SpatialIndex.outline_box(fp, self.layer)
+            if box is None:
+                continue
+            with_silk.append(fp)
+            corners.extend((fp.at.coord, c) for c in SpatialIndex._corners(box))
+        if corners:
+            parents, points = zip(*corners)
+            abs_corners = PCB_Transformer.Geometry.abs_pos_array(parents, points)
+            for i, fp in enumerate(with_silk):
+                out.insert(fp, SpatialIndex._bounds(abs_corners[4 * i : 4 * i + 4, :2]))
+
+        ignore = set(ignore)
+        for text in texts:
+            if text.layer.node[1] != self.layer or text.text in ignore:
+                continue
+            x, y = text.at.coord[:2]
+            hw, hh = self.extent(text.text, text.font)
+            out.insert(text, (x - hw, y - hh, x + hw, y + hh))
+        return out
+
+    def place(
+        self,
+        labels: List[Label],
+        pads: SpatialIndex,
+        silkscreen: Optional[SpatialIndex] = None,
+    ) -> Placement:
+        """
+        Position of every label, see the class doc. pads is queried for Pad
+        items only, silkscreen (see silkscreen()) for everything & gets the
+        placed labels added as At items.
+        """
+        if silkscreen is None:
+            silkscreen = SpatialIndex()
+        c = self.clearance
+        centers, boxes = self.candidates(labels)
+
+        def blocked(candidates: np.ndarray, obstacles: List[SpatialIndex.Box]):
+            if not obstacles:
+                return np.zeros(len(candidates), dtype=bool)
+            o = np.array(obstacles, dtype=float).T
+            a = candidates[:, :, None]
+            return np.any(
+                (a[:, 0] - c < o[2])
+                & (o[0] < a[:, 2] + c)
+                & (a[:, 1] - c < o[3])
+                & (o[1] < a[:, 3] + c),
+                axis=1,
+            )
+
+        # static obstacles first, one query over all candidates of a label
+        free = np.empty(boxes.shape[:2], dtype=bool)
+        for i, reach in enumerate(self.reach(boxes).tolist()):
+            obstacles = [
+                pads.boxes[id(item.node)] for item in pads.query(reach, (Pad,))
+            ]
+            obstacles.extend(
+                silkscreen.boxes[id(item.node)] for item in silkscreen.query(reach)
+            )
+            free[i] = ~blocked(boxes[i], obstacles)
+
+        chosen = np.zeros(len(labels), dtype=int)
+        crowded = []
+        ats: Dict[int, At] = {}
+        for i in np.argsort(free.sum(axis=1), kind="stable").tolist():
+            found = None
+            for k in np.flatnonzero(free[i]).tolist():
+                box = boxes[i, k].tolist()
+                reach = (box[0] - c, box[1] - c, box[2] + c, box[3] + c)
+                others = [
+                    silkscreen.boxes[id(item.node)]
+                    for item in silkscreen.query(reach, (At,))
+                ]
+                if not blocked(boxes[i, k : k + 1], others)[0]:
+                    found = k
+                    break
+            if found is None:
+                crowded.append(i)
+                free_ks = np.flatnonzero(free[i])
+                found = int(free_ks[0]) if len(free_ks) else 0
+            chosen[i] = found
+
+            at = At.factory((*centers[i, found].round(4).tolist(), 0))
+            silkscreen.insert(at, tuple(boxes[i, found].tolist()))
+            ats[i] = at
+
+        for i in crowded:
+            logger.warning(f"No free spot for label {labels[i][0]}")
+
+        return self.Placement(
+            [ats[i] for i in range(len(labels))],
+            boxes[np.arange(len(labels)), chosen].reshape(-1, 4),
+            sorted(crowded),
+        )
+
+
+class PlacementOptimizer:
+    """
+    Simulated annealing over the positions & rotations of footprints.
+    Minimizes the half perimeter wire length (HPWL) of all nets plus the
+    weighted overlap area of footprint boxes.
+    A move only re-evaluates the nets of the moved footprint (numpy over
+    the pads of those nets) & the overlap of its box with all others.
+    FBRK:notouch & fixed footprints do not move but still count as
+    obstacles, all others stay inside bounds.
+    """
+
+    def __init__(
+        self,
+        footprints: List[Footprint],
+        nets: NetIndex,
+        bounds: SpatialIndex.Box,
+        overlap_weight: float = 10.0,
+        max_net_size: Optional[int] = None,
+        grid: float = 0.05,
+        fixed: Iterable[Footprint] = (),
+    ) -> None:
+        self.footprints = footprints
+        self.bounds = bounds
+        self.overlap_weight = overlap_weight
+        self.grid = grid
+
+        n = len(footprints)
+        coords = np.array([fp.at.coord for fp in footprints], dtype=float)
+        self.coords = coords.reshape(n, 3)
+        self._placed = self.coords.copy()
+        fixed_nodes = {id(fp.node) for fp in fixed}
+        self.movable = np.array(
+            [
+                id(fp.node) not in fixed_nodes
+                and not any(t.text == "FBRK:notouch" for t in fp.user_text)
+                for fp in footprints
+            ],
+            dtype=bool,
+        )
+        self._local = np.array([self._local_box(fp) for fp in footprints]).reshape(n, 4)
+
+        self._build_nets(nets, max_net_size)
+        self._fit_into_bounds()
+
+        self.boxes = np.array(
+            [self._box(f, *self.coords[f]) for f in range(n)], dtype=float
+        ).reshape(n, 4)
+        self.pos = self._pad_positions()
+        self.hpwl = self._net_lengths(self.pos)
+
+    # Setup -------------------------------------------------------------------
+    @staticmethod
+    def _local_box(fp: Footprint) -> SpatialIndex.Box:
+        # bounds of outline & pads in the frame of fp
+        boxes = []
+        outline = SpatialIndex.outline_box(fp)
+        if outline is not None:
+            boxes.append(outline)
+        pads = fp.get_views(Pad, "pad")
+        if pads:
+            coords = np.array([pad.at.coord for pad in pads], dtype=float)
+            sizes = np.array([pad.size for pad in pads], dtype=float)
+            # pad rotation is stored absolute
+            ext = SpatialIndex._extents(sizes, coords[:, 2] - fp.at.coord[2])
+            boxes.extend(np.hstack((coords[:, :2] - ext, coords[:, :2] + ext)).tolist())
+        if not boxes:
+            return 0, 0, 0, 0
+        boxes = np.array(boxes)
+        return (*boxes[:, :2].min(axis=0), *boxes[:, 2:].max(axis=0))
+
+    def _build_nets(self, nets: NetIndex, max_net_size: Optional[int]):
+        owners, offsets, starts = [], [], [0]
+        for members in nets.members(self.footprints, max_net_size).values():
+            owners.extend(f for f, _ in members)
+            offsets.extend(offset for _, offset in members)
+            starts.append(len(owners))
+
+        # pads grouped by net, net k owns pads starts[k]:starts[k+1]
+        self.pad_fp = np.array(owners, dtype=int)
+        self.pad_offset = np.array(offsets, dtype=float).reshape(-1, 2)
+        self.net_start = np.array(starts, dtype=int)
+        pad_net = np.repeat(np.arange(len(starts) - 1), np.diff(starts))
+
+        # per footprint: its pads, the pads of its nets & where its own pads
+        # are among those
+        self._fp_pads, self._fp_nets, self._offsets = [], [], []
+        self._gather, self._gather_starts, self._own, self._slot = [], [], [], []
+        for f in range(len(self.footprints)):
+            own_pads = np.flatnonzero(self.pad_fp == f)
+            fp_nets = np.unique(pad_net[own_pads])
+            gather = np.concatenate(
+                [np.arange(self.net_start[k], self.net_start[k + 1]) for k in fp_nets]
+                or [np.empty(0, dtype=int)]
+            )
+            lengths = np.diff(self.net_start)[fp_nets]
+            own = np.flatnonzero(self.pad_fp[gather] == f)
+
+            self._fp_pads.append(own_pads)
+            self._offsets.append(self.pad_offset[own_pads])
+            self._fp_nets.append(fp_nets)
+            self._gather.append(gather)
+            self._gather_starts.append(np.concatenate(([0], np.cumsum(lengths)[:-1])))
+            self._own.append(own)
+            self._slot.append(np.searchsorted(own_pads, gather[own]))
+
+    def _fit_into_bounds(self):
+        # movable footprints start inside bounds, so every move can keep them
+        xmin, ymin, xmax, ymax = self.bounds
+        for f in np.flatnonzero(self.movable):
+            x, y, rot = self.coords[f]
+            lx0, ly0, lx1, ly1 = self._extents(f, rot)
+            if lx1 - lx0 > xmax - xmin or ly1 - ly0 > ymax - ymin:
+                raise ValueError(
+                    f"{self.footprints[f].reference.text} does not fit into bounds"
+                )
+            self.coords[f, 0] = min(max(x, xmin - lx0), xmax - lx1)
+            self.coords[f, 1] = min(max(y, ymin - ly0), ymax - ly1)
+
+    # Geometry ----------------------------------------------------------------
+    def _extents(self, f: int, rot: float) -> SpatialIndex.Box:
+        # local box of f rotated by rot, relative to its origin
+        xmin, ymin, xmax, ymax = self._local[f]
+        rad = math.radians(rot)
+        c, s = math.cos(rad), math.sin(rad)
+        corners = [(xmin, ymin), (xmin, ymax), (xmax, ymin), (xmax, ymax)]
+        xs = [x * c + y * s for x, y in corners]
+        ys = [-x * s + y * c for x, y in corners]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def _box(self, f: int, x: float, y: float, rot: float) -> SpatialIndex.Box:
+        lx0, ly0, lx1, ly1 = self._extents(f, rot)
+        return x + lx0, y + ly0, x + lx1, y + ly1
+
+    def _inside(self, box: SpatialIndex.Box) -> bool:
+        xmin, ymin, xmax, ymax = self.bounds
+        eps = 1e-9
+        return (
+            box[0] >= xmin - eps
+            and box[1] >= ymin - eps
+            and box[2] <= xmax + eps
+            and box[3] <= ymax + eps
+        )
+
+    def _place_pads(self, f: int, x: float, y: float, rot: float) -> np.ndarray:
+        # like Geometry.abs_pos_array, without rounding
+        rad = math.radians(rot)
+        c, s = math.cos(rad), math.sin(rad)
+        return self._offsets[f] @ np.array(((c, -s), (s, c))) + (x, y)
+
+    def _pad_positions(self) -> np.ndarray:
+        out = np.empty_like(self.pad_offset)
+        for f in range(len(self.footprints)):
+            out[self._fp_pads[f]] = self._place_pads(f, *self.coords[f])
+        return out
+
+    def _net_lengths(self, pos: np.ndarray) -> np.ndarray:
+        if len(self.net_start) < 2:
+            return np.empty(0)
+        starts = self.net_start[:-1]
+        lo = np.minimum.reduceat(pos, starts, axis=0)
+        hi = np.maximum.reduceat(pos, starts, axis=0)
+        return (hi - lo).sum(axis=1)
+
+    def _overlap(self, f: int, boxes) -> np.ndarray:
+        # overlap areas of (K, 4) boxes with the boxes of all footprints but f
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4, 1)
+        b = self.boxes.T
+        w = np.minimum(b[2], boxes[:, 2]) - np.maximum(b[0], boxes[:, 0])
+        h = np.minimum(b[3], boxes[:, 3]) - np.maximum(b[1], boxes[:, 1])
+        area = np.maximum(w, 0) * np.maximum(h, 0)
+        area[:, f] = 0
+        return area.sum(axis=1)
+
+    # Cost --------------------------------------------------------------------
+    def wire_length(self) -> float:
+        return float(self.hpwl.sum())
+
+    def overlap(self) -> float:
+        total = sum(
+            float(self._overlap(f, self.boxes[f])[0]) for f in range(len(self.boxes))
+        )
+        return total / 2
+
+    def cost(self) -> float:
+        return self.wire_length() + self.overlap_weight * self.overlap()
+
+    def _try(self, f: int, x: float, y: float, rot: float):
+        """
+        Cost delta of moving f, with what commit needs, None if out of bounds.
+        """
+        box = self._box(f, x, y, rot)
+        if not self._inside(box):
+            return None
+        pads = self._place_pads(f, x, y, rot)
+
+        delta = 0.0
+        hpwl = None
+        gather = self._gather[f]
+        if len(gather):
+            pos = self.pos[gather]
+            pos[self._own[f]] = pads[self._slot[f]]
+            starts = self._gather_starts[f]
+            lo = np.minimum.reduceat(pos, starts, axis=0)
+            hi = np.maximum.reduceat(pos, starts, axis=0)
+            hpwl = (hi - lo).sum(axis=1)
+            delta = float(hpwl.sum() - self.hpwl[self._fp_nets[f]].sum())
+
+        if self.overlap_weight:
+            new, old = self._overlap(f, (box, self.boxes[f]))
+            delta += self.overlap_weight * float(new - old)
+        return delta, (f, (x, y, rot), box, pads, hpwl)
+
+    def _commit(self, change):
+        f, coord, box, pads, hpwl = change
+        self.coords[f] = coord
+        self.boxes[f] = box
+        self.pos[self._fp_pads[f]] = pads
+        if hpwl is not None:
+            self.hpwl[self._fp_nets[f]] = hpwl
+
+    def _current(self, f: int):
+        # a change that puts f back where it is now
+        return (
+            f,
+            tuple(self.coords[f]),
+            tuple(self.boxes[f]),
+            self.pos[self._fp_pads[f]].copy(),
+            self.hpwl[self._fp_nets[f]].copy() if len(self._gather[f]) else None,
+        )
+
+    # Annealing ---------------------------------------------------------------
+    def _propose(self, rng: np.random.Generator, step: float):
+        """
+        Random shift, rotation or swap of movable footprints as a list of
+        (footprint, x, y, rot).
+        """
+        movable = self._movable
+        f = int(movable[rng.integers(len(movable))])
+        x, y, rot = self.coords[f]
+        kind = rng.random()
+        if kind < 0.1:
+            return [(f, x, y, (rot + 90 * rng.integers(1, 4)) % 360)]
+        if kind < 0.3 and len(movable) > 1:
+            g = int(movable[rng.integers(len(movable))])
+            if g != f:
+                gx, gy, grot = self.coords[g]
+                return [(f, gx, gy, rot), (g, x, y, grot)]
+        dx, dy = rng.normal(0, step, 2)
+        return [(f, self._snap(x + dx), self._snap(y + dy), rot)]
+
+    def _snap(self, value: float) -> float:
+        if self.grid <= 0:
+            return float(value)
+        return round(value / self.grid) * self.grid
+
+    def run(
+        self,
+        moves: int = 100_000,
+        seed: Optional[int] = None,
+        t_start: Optional[float] = None,
+        t_end: Optional[float] = None,
+    ) -> float:
+        """
+        Anneal for the given number of moves and return the final cost.
+        The temperature falls geometrically from t_start (by default the
+        mean cost change of random moves) to t_end (t_start / 1000).
+        """
+        self._movable = np.flatnonzero(self.movable)
+        if len(self._movable) == 0 or moves <= 0:
+            return self.cost()
+
+        rng = np.random.default_rng(seed)
+        xmin, ymin, xmax, ymax = self.bounds
+        step_start = max(xmax - xmin, ymax - ymin) / 4
+        step_end = max(self.grid, 0.01)
+
+        if t_start is None:
+            samples = []
+            for _ in range(min(200, moves)):
+                for f, x, y, rot in self._propose(rng, step_start)[:1]:
+                    tried = self._try(f, x, y, rot)
+                    if tried is not None:
+                        samples.append(abs(tried[0]))
+            t_start = float(np.mean(samples)) if samples else 1.0
+            t_start = t_start or 1.0
+        if t_end is None:
+            t_end = t_start / 1000
+
+        cost = self.cost()
+        ratio = t_end / t_start
+        for i in range(moves):
+            progress = i / moves
+            t = t_start * ratio**progress
+            step = max(step_start * (t / t_start), step_end)
+
+            proposal = self._propose(rng, step)
+            undo, delta = [], 0.0
+            for f, x, y, rot in proposal:
+                tried = self._try(f, x, y, rot)
+                if tried is None:
+                    delta = None
+                    break
+                undo.append(self._current(f))
+                self._commit(tried[1])
+                delta += tried[0]
+
+            if delta is not None and (
+                delta <= 0 or rng.random() < math.exp(-delta / t)
+            ):
+                cost += delta
+                continue
+            for change in reversed(undo):
+                self._commit(change)
+
+        return cost
+
+    # Results -----------------------------------------------------------------
+    def assignments(self) -> List[Tuple[Footprint, At.Coord]]:
+        """
+        New coords of all footprints that moved, for move_many.
+        """
+        moved = np.any(self.coords != self._placed, axis=1)
+        return [
+            (self.footprints[f], tuple(round(v, 4) for v in self.coords[f].tolist()))
+            for f in np.flatnonzero(moved)
+        ]
+
+
+class Ratsnest:
+    """
+    Minimum spanning tree length of every net over the absolute positions of
+    its pads, the usual wire length estimate of a placement.
+    Pads are grouped by net once, lengths only needs footprint coords: all
+    pads are placed with one Geometry.abs_pos_array call & all nets with the
+    same number of pads share one vectorized run of Prim's algorithm.
+    """
+
+    class Report(NamedTuple):
+        total: float
+        # net name -> length, longest first
+        nets: Dict[str, float]
+
+        def __str__(self) -> str:
+            return f"Ratsnest {self.total:.2f} mm over {len(self.nets)} nets"
+
+    def __init__(
+        self,
+        footprints: List[Footprint],
+        nets: NetIndex,
+        max_net_size: Optional[int] = None,
+    ) -> None:
+        self.footprints = footprints
+        members = nets.members(footprints, max_net_size)
+
+        # nets sorted by size, so every size is one contiguous (M, K) block
+        order = sorted(members, key=lambda net: len(members[net]))
+        self.nets = np.array(order, dtype=int)
+        self.names = [nets.names.get(net, str(net)) for net in order]
+        pads = [member for net in order for member in members[net]]
+        self.pad_fp = np.array([f for f, _ in pads], dtype=int)
+        self.pad_offset = np.array([offset for _, offset in pads], dtype=float)
+        self.pad_offset = self.pad_offset.reshape(-1, 2)
+
+        # (size, number of nets, first net, first pad) per block
+        sizes = np.array([len(members[net]) for net in order], dtype=int)
+        pad_start = np.concatenate(([0], np.cumsum(sizes)))
+        ks, firsts, counts = np.unique(sizes, return_index=True, return_counts=True)
+        self._blocks: List[Tuple[int, int, int, int]] = [
+            (k, m, first, int(pad_start[first]))
+            for k, first, m in zip(ks.tolist(), firsts.tolist(), counts.tolist())
+        ]
+
+    @classmethod
+    def from_pcb(cls, pcb: PCB, max_net_size: Optional[int] = None) -> "Ratsnest":
+        return cls(pcb.footprints, NetIndex.from_pcb(pcb), max_net_size)
+
+    def coords(self) -> np.ndarray:
+        """
+        Current (F, 3) coords of the footprints.
+        """
+        coords = np.array([fp.at.coord for fp in self.footprints], dtype=float)
+        return coords.reshape(len(self.footprints), 3)
+
+    def positions(self, coords: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Absolute (P, 2) pad positions, grouped by net.
+        """
+        if coords is None:
+            coords = self.coords()
+        parents = np.asarray(coords, dtype=float)[self.pad_fp]
+        return PCB_Transformer.Geometry.abs_pos_array(parents, self.pad_offset)[:, :2]
+
+    @staticmethod
+    def _mst(points: np.ndarray) -> np.ndarray:
+        # (M, K, 2) points -> (M,) spanning tree lengths, Prim's on all M
+        # nets at once, memory stays O(M K)
+        m, k, _ = points.shape
+        if k == 2:
+            return np.hypot(*(points[:, 1] - points[:, 0]).T)
+
+        xs, ys = points[:, :, 0].copy(), points[:, :, 1].copy()
+        rows = np.arange(m)
+        total = np.zeros(m)
+        # squared distance to the tree, pads in the tree are inf & get nan
+        # coordinates, fmin ignores the nan distances to them
+        j = np.zeros(m, dtype=int)
+        best = np.full((m, k), np.inf)
+        step = np.empty((m, k))
+        for _ in range(k - 1):
+            x, y = xs[rows, j][:, None], ys[rows, j][:, None]
+            xs[rows, j] = np.nan
+            best[rows, j] = np.inf
+            np.subtract(xs, x, out=step)
+            np.square(step, out=step)
+            step += np.square(ys - y)
+            np.fmin(best, step, out=best)
+            j = best.argmin(axis=1)
+            total += np.sqrt(best[rows, j])
+        return total
+
+    def lengths(self, coords: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        MST length per net (in the order of self.nets) for (F, 3) footprint
+        coords, the current placement by default.
+        Pass e.g. FootprintTable.coords or PlacementOptimizer.coords to
+        evaluate a placement before writing it back.
+        """
+        pos = self.positions(coords)
+        out = np.empty(len(self.nets))
+        for k, m, first, pad in self._blocks:
+            block = pos[pad : pad + m * k].reshape(m, k, 2)
+            out[first : first + m] = self._mst(block)
+        return out
+
+    def total(self, coords: Optional[np.ndarray] = None) -> float:
+        return float(self.lengths(coords).sum())
+
+    def report(self, coords: Optional[np.ndarray] = None) -> "Ratsnest.Report":
+        lengths = self.lengths(coords)
+        order = np.argsort(-lengths, kind="stable")
+        return self.Report(
+            float(lengths.sum()),
+            {self.names[i]: float(lengths[i]) for i in order.tolist()},
+        )
+
+
+class MoveReport(NamedTuple):
+    moved: List[Footprint]
+    # FBRK:notouch footprints, left where they are
+    skipped: List[Footprint]
+
+
+class FanoutReport(NamedTuple):
+    placed: List[Tuple[Interface, Tuple[float, float]]]
+    # no room for a via within reach
+    failed: List[Interface]
+    # pads without a net, they get no via
+    no_net: List[Interface]
+
+
 class PCB_Transformer:
     class has_linked_kicad_footprint(ComponentTrait):
         def get_fp(self) -> Footprint:
@@ -45,11 +1440,36 @@ class PCB_Transformer:
         # After finalized, vias get changed to 0.45
         self.via_size_drill = (0.46, 0.2)
 
-        self.tstamp_i = itertools.count()
+        # inserted by this transformer, the ones of earlier runs are found by
+        # their tstamps
+        self._generated: List[Via | GR_Text] = []
+
+        self._spatial: Optional[SpatialIndex] = None
+        self._nets: Optional[NetIndex] = None
+        # interface -> footprint & pad name, filled by attach
+        self._intf_pads: Dict[Interface, Tuple[Footprint, str]] = {}
 
         self.attach()
         self.cleanup()
 
+    @property
+    def nets(self) -> NetIndex:
+        """
+        Built on first use, kept up to date by insert_via.
+        """
+        if self._nets is None:
+            self._nets = NetIndex.from_pcb(self.pcb)
+        return self._nets
+
+    @property
+    def spatial(self) -> SpatialIndex:
+        """
+        Built on first use, kept up to date by move_fp, move_table & insert_via.
+        """
+        if self._spatial is None:
+            self._spatial = SpatialIndex.from_pcb(self.pcb)
+        return self._spatial
+
     def attach(self):
         footprints = {(f.reference.text, f.name): f for f in self.pcb.footprints}
 
@@ -70,9 +1490,14 @@ class PCB_Transformer:
 
             cmp.add_trait(self.has_linked_kicad_footprint_defined(fp))
 
+            if not cmp.has_trait(has_footprint_pinmap):
+                continue
+            pin_map = cmp.get_trait(has_footprint_pinmap).get_pin_map()
+            for pin_name, intf in pin_map.items():
+                self._intf_pads.setdefault(intf, (fp, pin_name))
+
     def set_dimensions(self, width_mm: float, height_mm: float):
-        for line_node in self.pcb.get_prop("gr_line"):
-            line = Line.from_node(line_node)
+        for line in self.pcb.select("gr_line", Line):
             if line.layer.node[1] != "Edge.Cuts":
                 continue
             line.delete()
@@ -99,34 +1524,233 @@ class PCB_Transformer:
         self.dimensions = (width_mm, height_mm)
 
     def move_fp(self, fp: Footprint, coord: At.Coord):
-        if any(filter(lambda x: x.text == "FBRK:notouch", fp.user_text)):
+        self.move_many([(fp, coord)])
+
+    def move_many(self, assignments: Iterable[Tuple[Footprint, At.Coord]]):
+        """
+        Move footprints to their coords in one pass, the last coord of a
+        footprint wins. FBRK:notouch footprints stay where they are, moved
+        ones get an FBRK:autoplaced marker unless they already have one.
+        """
+        targets: Dict[int, Tuple[Footprint, At.Coord]] = {}
+        for fp, coord in assignments:
+            targets[id(fp.node)] = (fp, coord)
+
+        moved, skipped, unmarked = [], [], []
+        for fp, coord in targets.values():
+            markers = {text.text for text in fp.user_text}
+            if "FBRK:notouch" in markers:
+                skipped.append(fp)
+                continue
+            fp.at.coord = coord
+            moved.append(fp)
+            if "FBRK:autoplaced" not in markers:
+                unmarked.append(fp)
+
+        for fp in unmarked:
+            self._mark_autoplaced(fp)
+        if self._spatial is not None:
+            self._spatial.insert_footprints(moved)
+
+        for fp in skipped:
             logger.warning(f"Skipped no touch component: {fp.name}")
-            return
+        return MoveReport(moved, skipped)
 
-        fp.at.coord = coord
+    def pack(
+        self,
+        groups: List[Optional[List[Tuple[Component, int]]]],
+        packer: RowPacker,
+        bounds: Optional[SpatialIndex.Box] = None,
+        per_line: Optional[int] = None,
+        gap: Tuple[float, float] = (0, 0),
+        vertical: bool = False,
+    ) -> MoveReport:
+        """
+        Pack groups of (component, rotation) with packer (see RowPacker.pack)
+        and move them there. bounds default to the board of set_dimensions.
+        """
+        if bounds is None:
+            assert self.dimensions is not None, "set_dimensions or pass bounds"
+            bounds = (0, 0, *self.dimensions)
+
+        items = [
+            [(self.get_fp(cmp), rot) for cmp, rot in group]
+            if group is not None
+            else None
+            for group in groups
+        ]
+        packing = packer.pack(items, bounds, per_line, gap, vertical)
+        return self.move_many(packing.moves)
 
-        if any(filter(lambda x: x.text == "FBRK:autoplaced", fp.user_text)):
-            return
+    def optimize_placement(
+        self,
+        footprints: Optional[List[Footprint]] = None,
+        moves: int = 100_000,
+        seed: Optional[int] = None,
+        overlap_weight: float = 10.0,
+        max_net_size: Optional[int] = None,
+    ) -> MoveReport:
+        """
+        Anneal the placement of footprints (all by default) inside the board
+        of set_dimensions and move them there, see PlacementOptimizer.
+        The other footprints stay where they are.
+        """
+        assert self.dimensions is not None, "set_dimensions first"
+        all_fps = self.pcb.footprints
+        fixed = []
+        if footprints is not None:
+            chosen = {id(fp.node) for fp in footprints}
+            fixed = [fp for fp in all_fps if id(fp.node) not in chosen]
+
+        optimizer = PlacementOptimizer(
+            all_fps,
+            self.nets,
+            (0, 0, *self.dimensions),
+            overlap_weight=overlap_weight,
+            max_net_size=max_net_size,
+            fixed=fixed,
+        )
+        before = optimizer.cost()
+        after = optimizer.run(moves, seed)
+        logger.info(f"Placement cost {before:.2f} -> {after:.2f}")
+        return self.move_many(optimizer.assignments())
+
+    def ratsnest(self, max_net_size: Optional[int] = None) -> Ratsnest:
+        """
+        Ratsnest of all footprints on the board, keep it around & call its
+        lengths/report for every placement to compare.
+        """
+        return Ratsnest(self.pcb.footprints, self.nets, max_net_size)
+
+    def _mark_autoplaced(self, fp: Footprint):
         fp.append(
             FP_Text.factory(
                 text="FBRK:autoplaced",
                 at=At.factory((0, 0, 0)),
                 font=self.font,
-                tstamp=str(next(self.tstamp_i)),
+                tstamp=str(uuid.uuid4()),
                 layer="User.5",
             )
         )
 
-    def cleanup(self):
-        # delete auto-placed vias
-        # determined by their size_drill values
-        for via in self.pcb.vias:
-            if via.size_drill == self.via_size_drill:
-                via.delete()
+    def move_table(self, table: FootprintTable) -> MoveReport:
+        """
+        Write back all moved rows of the table with move_many.
+        """
+        rows = np.flatnonzero(table.moved)
+        coords = table.coords[rows].tolist()
+        report = self.move_many(
+            (table.footprints[i], tuple(coord)) for i, coord in zip(rows, coords)
+        )
+
+        moved = {id(fp.node) for fp in report.moved}
+        rows = [i for i in rows if id(table.footprints[i].node) in moved]
+        table.autoplaced[rows] = True
+        table._placed[rows] = table.coords[rows]
+        return report
 
-        for text in self.pcb.text:
-            if text.text.endswith("_FBRK_AUTO"):
-                text.delete()
+    # vias & temporary texts get uuid tstamps starting with this
+    TSTAMP_NAMESPACE = "fbfbfbfb-"
+
+    def _generated_tstamp(self) -> str:
+        return self.TSTAMP_NAMESPACE + str(uuid.uuid4())[len(self.TSTAMP_NAMESPACE) :]
+
+    def _is_generated(self, item: Node) -> bool:
+        tstamps = item.get_views(Node, "tstamp")
+        return bool(tstamps) and str(tstamps[0].node[1]).startswith(
+            self.TSTAMP_NAMESPACE
+        )
+
+    def generated(self) -> List[Via | GR_Text]:
+        """
+        Vias & texts inserted by faebryk, now & in earlier runs.
+        The ones on the loaded board are found by searching its source for
+        the tstamp namespace instead of walking all vias & texts.
+        """
+        pcb = self.pcb
+        if pcb.source is not None and isinstance(pcb.node, SexpList):
+            needle = self.TSTAMP_NAMESPACE.encode()
+            nodes = sexp.find_children(pcb.node, pcb.source, needle)
+        else:
+            nodes = [*pcb.select("via"), *pcb.select("gr_text")]
+            nodes = [n.node for n in nodes]
+
+        kinds = {"via": Via, "gr_text": GR_Text}
+        out: Dict[int, Via | GR_Text] = {}
+        for node in nodes:
+            kind = kinds.get(str(node[0]))
+            if kind is None:
+                continue
+            item = kind.view(node)
+            if self._is_generated(item):
+                out[id(node)] = item
+        for item in self._generated:
+            if not sexp._is_empty(item.node):
+                out.setdefault(id(item.node), item)
+        return list(out.values())
+
+    # before the namespace faebryk used counters & random ints as tstamps,
+    # kicad uses uuids
+    _LEGACY_TSTAMP = re.compile(rb'\(tstamp "?\d+"?\)')
+
+    @staticmethod
+    def _is_legacy(node: list) -> bool:
+        for child in node:
+            if (
+                isinstance(child, list)
+                and len(child) > 1
+                and type(child[0]) is Symbol
+                and str.__eq__(child[0], "tstamp")
+            ):
+                return str(child[1]).isdigit()
+        return False
+
+    def legacy_generated(self) -> List[Via | GR_Text]:
+        """
+        Vias & texts inserted by faebryk before the tstamp namespace.
+        Like generated(), found by searching the source of the loaded board
+        for numeric tstamps.
+        """
+        pcb = self.pcb
+        if pcb.source is not None and isinstance(pcb.node, SexpList):
+            nodes = sexp.find_children(pcb.node, pcb.source, self._LEGACY_TSTAMP)
+        else:
+            nodes = [*pcb.select("via"), *pcb.select("gr_text")]
+            nodes = [n.node for n in nodes]
+
+        kinds = {"via": Via, "gr_text": GR_Text}
+        out: List[Via | GR_Text] = []
+        for node in nodes:
+            kind = kinds.get(str(node[0]))
+            if kind is not None and self._is_legacy(node):
+                out.append(kind.view(node))
+        return out
+
+    def cleanup(self):
+        """
+        Delete the generated vias & temporary texts, in O(generated items),
+        including the ones of boards written before the tstamp namespace.
+        Vias resized to something other than via_size_drill and texts without
+        the _FBRK_AUTO suffix were finalized by hand and stay.
+        """
+        items = {id(item.node): item for item in self.generated()}
+        for item in self.legacy_generated():
+            items.setdefault(id(item.node), item)
+
+        for item in items.values():
+            if isinstance(item, Via):
+                if item.size_drill != self.via_size_drill:
+                    continue
+                if self._spatial is not None:
+                    self._spatial.remove(item)
+                if self._nets is not None:
+                    self._nets.remove_via(item)
+            elif not item.text.endswith("_FBRK_AUTO"):
+                continue
+            item.delete()
+        self._generated = [
+            item for item in self._generated if not sexp._is_empty(item.node)
+        ]
 
     @staticmethod
     def get_fp(cmp) -> Footprint:
@@ -143,29 +1767,77 @@ class PCB_Transformer:
         raise NotImplementedError()
 
     def insert_via(self, coord: Tuple[float, float], net: str):
-        self.pcb.append(
-            Via.factory(
-                at=At.factory(coord),
-                size_drill=self.via_size_drill,
-                layers=("F.Cu", "B.Cu"),
-                net=net,
-                tstamp=str(next(self.tstamp_i)),
-            )
+        via = Via.factory(
+            at=At.factory(coord),
+            size_drill=self.via_size_drill,
+            layers=("F.Cu", "B.Cu"),
+            net=net,
+            tstamp=self._generated_tstamp(),
         )
+        self.pcb.append(via)
+        self._generated.append(via)
+        if self._spatial is not None:
+            self._spatial.insert(via, SpatialIndex.via_box(via))
+        if self._nets is not None:
+            self._nets.add_via(via)
 
     def insert_text(self, text: str, at: "At", font: FP_Text.Font, permanent: bool):
-        # TODO find a better way for this
-        if not permanent:
-            text = text + "_FBRK_AUTO"
-        self.pcb.append(
-            GR_Text.factory(
+        self.insert_texts([(text, at)], font, permanent)
+
+    def insert_texts(
+        self, texts: Iterable[Tuple[str, At]], font: FP_Text.Font, permanent: bool
+    ):
+        # temporary texts are removed by the next cleanup, unless the suffix
+        # was removed by hand
+        for text, at in texts:
+            tstamp = str(uuid.uuid4())
+            if not permanent:
+                text = text + "_FBRK_AUTO"
+                tstamp = self._generated_tstamp()
+            node = GR_Text.factory(
                 text=text,
                 at=at,
                 layer="F.SilkS",
                 font=font,
-                tstamp=str(next(self.tstamp_i)),
+                tstamp=tstamp,
             )
-        )
+            self.pcb.append(node)
+            if not permanent:
+                self._generated.append(GR_Text.from_node(node))
+
+    def place_labels(
+        self,
+        labels: List[Tuple[str, Component | Footprint]],
+        offsets: List[Tuple[float, float]],
+        font: FP_Text.Font,
+        permanent: bool,
+        clearance: float = 0.1,
+    ) -> LabelPlacer.Placement:
+        """
+        Insert texts next to footprints (or the footprints of components) at
+        the first of offsets that overlaps no pad, silkscreen or other label,
+        see LabelPlacer.
+        Texts equal to a label are not obstacles, they are from the last run.
+        """
+        anchors = [
+            (target if isinstance(target, Footprint) else self.get_fp(target)).at.coord
+            for _, target in labels
+        ]
+
+        placer = LabelPlacer(offsets, font, clearance)
+        texts = [text for text, _ in labels]
+        items = list(zip(texts, anchors))
+
+        # only the footprints within reach of a label can be in the way
+        near: Dict[int, Footprint] = {}
+        for reach in placer.reach(placer.candidates(items)[1]).tolist():
+            for fp in self.spatial.query(tuple(reach), (Footprint,)):
+                near[id(fp.node)] = fp
+        silkscreen = placer.silkscreen(near.values(), self.pcb.text, ignore=texts)
+
+        placement = placer.place(items, self.spatial, silkscreen)
+        self.insert_texts(zip(texts, placement.ats), font, permanent)
+        return placement
 
     @staticmethod
     def get_any_fp_map(intf: Interface) -> Tuple[Dict[str, Interface], Component]:
@@ -180,15 +1852,15 @@ class PCB_Transformer:
         pin_map = obj.get_trait(has_footprint_pinmap).get_pin_map()
         return pin_map, obj
 
-    @staticmethod
-    def get_pad(intf: Interface) -> Tuple[Footprint, Pad]:
-        pin_map, cmp = PCB_Transformer.get_any_fp_map(intf)
-        pin_name = [k for k, v in pin_map.items() if v == intf][0]
-
-        fp = PCB_Transformer.get_fp(cmp)
-        pad = fp.get_pad(pin_name)
+    def get_pad(self, intf: Interface) -> Tuple[Footprint, Pad]:
+        found = self._intf_pads.get(intf)
+        if found is None:
+            pin_map, cmp = self.get_any_fp_map(intf)
+            pin_name = [k for k, v in pin_map.items() if v == intf][0]
+            found = self._intf_pads[intf] = (self.get_fp(cmp), pin_name)
 
-        return fp, pad
+        fp, pin_name = found
+        return fp, fp.get_pad(pin_name)
 
     def insert_via_next_to(self, intf: Interface, clearance: Tuple[float, float]):
         fp, pad = self.get_pad(intf)
@@ -201,171 +1873,289 @@ class PCB_Transformer:
         # print("Inserting via for", ".".join([y for x,y in intf.get_hierarchy()]), "at:", coord, "in net:", net)
         ...
 
-    def insert_via_triangle(
-        self, intfs: List[Interface], depth: float, clearance: float
-    ):
-        # get pcb pads
-        fp_pads = list(map(self.get_pad, intfs))
-        pads = [x[1] for x in fp_pads]
-        fp = fp_pads[0][0]
-
-        # from first & last pad
-        rect = [pads[-1].at.coord[i] - pads[0].at.coord[i] for i in range(2)]
-        assert 0 in rect
-        width = [p for p in rect if p != 0][0]
-        start = pads[0].at.coord
-
-        # construct triangle
-        shape = self.Geometry.triangle(
-            self.Geometry.abs_pos(fp.at.coord, start),
-            width=width,
-            depth=depth,
-            count=len(pads),
+    def fanout(
+        self,
+        intfs: List[Interface],
+        clearance: float = 0.2,
+        max_distance: float = 3.0,
+        direction: Optional[float] = None,
+        step: float = 0.25,
+    ) -> FanoutReport:
+        """
+        Place one via per interface next to its pad, all planned at once.
+        Candidates lie on rings around every pad (up to max_distance), turned
+        towards direction (degrees, counter clockwise like kicad) or by
+        default away from the footprint origin. Candidates closer than
+        clearance to pads & vias of other nets, to vias in general or
+        outside the board are dropped. The most constrained pads pick their
+        closest candidate first. Pads without a net get no via.
+        """
+        if not intfs:
+            return FanoutReport([], [], [])
+        r = self.via_size_drill[0] / 2
+
+        fp_pads = [self.get_pad(intf) for intf in intfs]
+        parents = [fp.at.coord for fp, _ in fp_pads]
+        centers = self.Geometry.abs_pos_array(
+            parents, [pad.at.coord for _, pad in fp_pads]
+        )[:, :2]
+        nets = [self.nets.net_of(pad) for _, pad in fp_pads]
+
+        # candidate offsets, ordered by distance & then by turn
+        turns = np.radians(np.arange(0, 91, 15))
+        turns = np.concatenate(
+            (turns[:1], np.ravel(np.column_stack((turns, -turns))[1:]))
         )
-
-        # clearance
-        shape = self.Geometry.translate(
-            tuple([clearance if x != 0 else 0 for x in rect]), shape
+        radii = np.arange(r + clearance, max_distance + 1e-9, step)
+        radius = np.repeat(radii, len(turns))
+        turn = np.tile(turns, len(radii))
+
+        if direction is None:
+            out = centers - np.array(parents, dtype=float)[:, :2]
+            angles = np.arctan2(out[:, 1], out[:, 0])
+        else:
+            # y points down on the board
+            angles = np.full(len(fp_pads), -np.radians(direction))
+        theta = angles[:, None] + turn[None, :]
+        candidates = np.stack(
+            (
+                centers[:, 0, None] + radius * np.cos(theta),
+                centers[:, 1, None] + radius * np.sin(theta),
+            ),
+            axis=-1,
         )
+        candidates = self.Geometry.round(candidates)
 
-        # place vias
-        for pad, point in zip(pads, shape):
-            self.insert_via(point, pad.net)
+        valid = np.array(
+            [
+                self._fanout_free(points, net, r, clearance)
+                for points, net in zip(candidates, nets)
+            ]
+        ).reshape(len(fp_pads), -1)
 
-    def insert_via_line(
-        self, intfs: List[Interface], length: float, clearance: float, angle_deg: float
-    ):
-        raise NotImplementedError()
-        # get pcb pads
-        fp_pads = list(map(self.get_pad, intfs))
-        pads = [x[1] for x in fp_pads]
-        fp = fp_pads[0][0]
-
-        # from first & last pad
-        start = pads[0].at.coord
-        abs_start = self.Geometry.abs_pos(fp.at.coord, start)
-
-        shape = self.Geometry.line(
-            start=abs_start,
-            length=length,
-            count=len(pads),
-        )
+        chosen: Dict[int, np.ndarray] = {}
+        placed = np.empty((0, 2))
+        for i in np.argsort(valid.sum(axis=1), kind="stable"):
+            if nets[i] is None:
+                continue
+            free = valid[i].copy()
+            if len(placed):
+                d = np.hypot(
+                    candidates[i, :, None, 0] - placed[None, :, 0],
+                    candidates[i, :, None, 1] - placed[None, :, 1],
+                )
+                free &= np.all(d - 2 * r >= clearance - 1e-6, axis=1)
+            found = np.flatnonzero(free)
+            if not len(found):
+                continue
+            chosen[i] = candidates[i, found[0]]
+            placed = np.vstack((placed, chosen[i]))
 
-        shape = self.Geometry.rotate(
-            axis=abs_start[:2],
-            structure=shape,
-            angle_deg=angle_deg,
+        report = FanoutReport([], [], [])
+        for i, intf in enumerate(intfs):
+            if nets[i] is None:
+                report.no_net.append(intf)
+                continue
+            if i not in chosen:
+                report.failed.append(intf)
+                continue
+            coord = tuple(chosen[i].tolist())
+            self.insert_via(coord, nets[i])
+            report.placed.append((intf, coord))
+        for intf in report.no_net:
+            logger.warning(f"No via for {intf}, its pad has no net")
+        for intf in report.failed:
+            logger.warning(f"No room for a via next to {intf}")
+        return report
+
+    def _fanout_free(
+        self, points: np.ndarray, net: int, r: float, clearance: float
+    ) -> np.ndarray:
+        # which points have room for a via of radius r
+        if not len(points):
+            return np.zeros(0, dtype=bool)
+        reach = r + clearance
+        region = (
+            points[:, 0].min() - reach,
+            points[:, 1].min() - reach,
+            points[:, 0].max() + reach,
+            points[:, 1].max() + reach,
         )
-
-        # clearance
-        shape = self.Geometry.translate((clearance, 0), shape)
-
-        # place vias
-        for pad, point in zip(pads, shape):
-            self.insert_via(point, pad.net)
-
-    def insert_via_line2(
-        self,
-        intfs: List[Interface],
-        length: Tuple[float, float],
-        clearance: Tuple[float, float],
-    ):
-        # get pcb pads
-        fp_pads = list(map(self.get_pad, intfs))
-        pads = [x[1] for x in fp_pads]
-        fp = fp_pads[0][0]
-
-        # from first & last pad
-        start = tuple(map(add, pads[0].at.coord, clearance))
-        abs_start = self.Geometry.abs_pos(fp.at.coord, start)
-
-        shape = self.Geometry.line2(
-            start=abs_start,
-            end=self.Geometry.abs_pos(abs_start, length),
-            count=len(pads),
+        ok = np.ones(len(points), dtype=bool)
+        if self.dimensions is not None:
+            w, h = self.dimensions
+            x, y = points[:, 0], points[:, 1]
+            ok &= (x - r >= 0) & (y - r >= 0) & (x + r <= w) & (y + r <= h)
+
+        obstacles = self.spatial.query(region, (Pad, Via))
+        if not obstacles:
+            return ok
+        boxes = np.array([self.spatial.boxes[id(o.node)] for o in obstacles])
+        is_via = np.array([isinstance(o, Via) for o in obstacles])
+        other_nets = [
+            o.net if isinstance(o, Via) else self.nets.net_of(o) for o in obstacles
+        ]
+        # pads of the same net only must not be covered
+        needed = np.array(
+            [
+                clearance if via or other != net else 0.0
+                for via, other in zip(is_via, other_nets)
+            ]
         )
 
-        # place vias
-        for pad, point in zip(pads, shape):
-            self.insert_via(point, pad.net)
+        x, y = points[:, 0, None], points[:, 1, None]
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - boxes[:, 2]), 0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - y, y - boxes[:, 3]), 0)
+        dist = np.hypot(dx, dy)
+        # vias are circles
+        cx, cy = (boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2
+        to_via = np.hypot(x - cx, y - cy) - (boxes[:, 2] - boxes[:, 0]) / 2
+        dist = np.where(is_via, to_via, dist)
+
+        return ok & np.all(dist - r >= needed - 1e-6, axis=1)
 
     # Geometry ----------------------------------------------------------------
     class Geometry:
+        """
+        The *_array functions take & return (N, 2) points or (N, 3) coords
+        (x, y, rotation in degrees), the others are wrappers for single shapes.
+        """
+
         Point = Tuple[float, float]
 
         @staticmethod
-        def abs_pos(parent: At.Coord, child: At.Coord) -> At.Coord:
-            x, y = parent[:2]
-            rot = 0
-            if len(parent) > 2:
-                rot = parent[2] / 360 * 2 * math.pi
+        def _array(points) -> np.ndarray:
+            out = np.asarray(points, dtype=float)
+            if out.ndim == 1:
+                return out.reshape(1, -1) if out.size else out.reshape(0, 2)
+            return out
 
-            cx, cy = child[:2]
+        @staticmethod
+        def round(values: np.ndarray, decimals: int = 2) -> np.ndarray:
+            """
+            Like python's round, unlike np.round: 33.815 is really 33.81499..,
+            but scaling it by 100 already rounds to the tie 3381.5.
+            Such ties are decided by the exact error of the scaling (Dekker).
+            """
+            scale = 10.0**decimals
+            scaled = values * scale
+            split = 134217729.0 * values
+            hi = split - (split - values)
+            lo = values - hi
+            error = (hi * scale - scaled) + lo * scale
+
+            out = np.rint(scaled)
+            tie = np.abs(scaled - np.trunc(scaled)) == 0.5
+            out = np.where(tie & (error > 0), np.ceil(scaled), out)
+            out = np.where(tie & (error < 0), np.floor(scaled), out)
+            return out / scale
 
-            rx = round(cx * math.cos(rot) + cy * math.sin(rot), 2)
-            ry = round(-cx * math.sin(rot) + cy * math.cos(rot), 2)
+        @classmethod
+        def abs_pos_array(cls, parents, children) -> np.ndarray:
+            """
+            Children positions in the frames of their parents, one parent per
+            child (e.g. every pad of every footprint) or one for all.
+            Offsets are rounded to 2 decimals like abs_pos, rotations are 0.
+            """
+            parents, children = cls._array(parents), cls._array(children)
+            rot = 0.0
+            if parents.shape[1] > 2:
+                rot = parents[:, 2] / 360 * 2 * np.pi
+            c, s = np.cos(rot), np.sin(rot)
+
+            cx, cy = children[:, 0], children[:, 1]
+            offsets = cls.round(np.column_stack((cx * c + cy * s, -cx * s + cy * c)))
+
+            out = parents[:, :2] + offsets
+            return np.column_stack((out, np.zeros(len(out))))
 
-            # print(f"Rotate {round(cx,2),round(cy,2)}, by {round(rot,2),parent[2]} to {rx,ry}")
+        @classmethod
+        def abs_pos(cls, parent: At.Coord, child: At.Coord) -> At.Coord:
+            x, y, _ = cls.abs_pos_array(parent, child)[0].tolist()
+            return x, y, 0
 
-            return x + rx, y + ry, 0
+        @classmethod
+        def translate_array(cls, vec: Point, points) -> np.ndarray:
+            vec = np.asarray(vec, dtype=float)
+            points = cls._array(points)
+            n = min(len(vec), points.shape[1])
+            return points[:, :n] + vec[:n]
 
-        @staticmethod
-        def translate(vec: Point, structure: List[Point]):
-            return [tuple(map(add, vec, point)) for point in structure]
+        @classmethod
+        def translate(cls, vec: Point, structure: List[Point]):
+            return [tuple(p) for p in cls.translate_array(vec, structure).tolist()]
 
         @classmethod
-        def rotate(
-            cls, axis: Point, structure: List[Point], angle_deg: float
-        ) -> List[Point]:
+        def rotate_array(cls, axis: Point, points, angle_deg: float) -> np.ndarray:
             theta = np.radians(angle_deg)
             c, s = np.cos(theta), np.sin(theta)
             R = np.array(((c, -s), (s, c)))
 
-            return cls.translate(
-                (-axis[0], -axis[1]),
-                [
-                    tuple(R @ np.array(point))
-                    for point in cls.translate(axis, structure)
-                ],
-            )
+            axis = np.asarray(axis[:2], dtype=float)
+            shifted = cls.translate_array(axis, cls._array(points)[:, :2])
+            return shifted @ R.T - axis
 
-        @staticmethod
-        def triangle(start: At.Coord, width: float, depth: float, count: int):
+        @classmethod
+        def rotate(
+            cls, axis: Point, structure: List[Point], angle_deg: float
+        ) -> List[Point]:
+            points = cls.rotate_array(axis, structure, angle_deg)
+            return [tuple(p) for p in points.tolist()]
+
+        @classmethod
+        def triangle_array(
+            cls, start: At.Coord, width: float, depth: float, count: int
+        ) -> np.ndarray:
             x1, y1 = start[:2]
 
             n = count - 1
             cy = width / n
+            i = np.arange(count)
 
-            ys = [round(y1 + cy * i, 2) for i in range(count)]
-            xs = [
-                round(x1 + depth * (1 - abs(1 - 1 / n * i * 2)), 2)
-                for i in range(count)
-            ]
+            ys = cls.round(y1 + cy * i, 2)
+            xs = cls.round(x1 + depth * (1 - np.abs(1 - 1 / n * i * 2)), 2)
 
-            return list(zip(xs, ys))
+            return np.column_stack((xs, ys))
 
-        @staticmethod
-        def line(start: At.Coord, length: float, count: int):
+        @classmethod
+        def triangle(cls, start: At.Coord, width: float, depth: float, count: int):
+            points = cls.triangle_array(start, width, depth, count)
+            return [tuple(p) for p in points.tolist()]
+
+        @classmethod
+        def line_array(cls, start: At.Coord, length: float, count: int) -> np.ndarray:
             x1, y1 = start[:2]
 
             n = count - 1
             cy = length / n
 
-            ys = [round(y1 + cy * i, 2) for i in range(count)]
-            xs = [x1] * count
+            ys = cls.round(y1 + cy * np.arange(count), 2)
+            xs = np.full(count, x1, dtype=float)
 
-            return list(zip(xs, ys))
+            return np.column_stack((xs, ys))
 
-        @staticmethod
-        def line2(start: At.Coord, end: At.Coord, count: int):
+        @classmethod
+        def line(cls, start: At.Coord, length: float, count: int):
+            x1 = start[0]
+            # x is passed through unchanged
+            return [(x1, y) for _, y in cls.line_array(start, length, count).tolist()]
+
+        @classmethod
+        def line2_array(cls, start: At.Coord, end: At.Coord, count: int) -> np.ndarray:
             x1, y1 = start[:2]
             x2, y2 = end[:2]
 
             n = count - 1
             cx = (x2 - x1) / n
             cy = (y2 - y1) / n
+            i = np.arange(count)
+
+            ys = cls.round(y1 + cy * i, 2)
+            xs = cls.round(x1 + cx * i, 2)
 
-            ys = [round(y1 + cy * i, 2) for i in range(count)]
-            xs = [round(x1 + cx * i, 2) for i in range(count)]
+            return np.column_stack((xs, ys))
 
-            return list(zip(xs, ys))
+        @classmethod
+        def line2(cls, start: At.Coord, end: At.Coord, count: int):
+            points = cls.line2_array(start, end, count)
+            return [tuple(p) for p in points.tolist()]
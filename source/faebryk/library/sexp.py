@@ -0,0 +1,848 @@
+# TODO should be part of faebryk
+
+import bisect
+import gc
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sexpdata import String, Symbol, tosexp
+
+logger = logging.getLogger(__name__)
+
+# one token per match: open, close, "string", bare atom or garbage
+_TOKEN = re.compile(
+    rb"\s*(?:"
+    rb"(\()"
+    rb"|(\))"
+    rb'|"([^"\\]*(?:\\.[^"\\]*)*)"'
+    rb'|((?:[^\s()"\\]|\\.)[^\s()"\\]*(?:\\.[^\s()"\\]*)*)'
+    rb"|(\S))",
+)
+_TRAILING = re.compile(rb"\s*")
+# top level forms of a KiCad file start on a new line at an indent of two
+_TOP_LEVEL = re.compile(rb"\n  (?=\()")
+
+# below this a linear scan beats building the head index
+INDEX_MIN_CHILDREN = 16
+
+
+class ParseError(Exception):
+    pass
+
+
+def _mutation(method):
+    def wrapper(self: "SexpList", *args, **kwargs):
+        head = self[0] if self else None
+        out = method(self, *args, **kwargs)
+        self._heads = self.memo = None
+        # the parent indexes this node under its head
+        if self.parent is not None and (self[0] if self else None) is not head:
+            self.parent._heads = self.parent.memo = None
+        self.touch()
+        return out
+
+    return wrapper
+
+
+class SexpList(list):
+    """
+    List node of a parsed tree.
+    Knows its parent and lazily indexes its children by their head symbol.
+
+    start/end is the byte span of the node in the parsed source (-1 if it has
+    none). dirty is set on a node and all its ancestors as soon as anything
+    in its subtree changes, clean nodes can be copied from the source as is.
+
+    journal is only set on roots: the parents that have deleted children
+    waiting for compact(). source is only set on unparsed LazySexpLists.
+
+    memo is free for users to cache things derived from the children of the
+    node (e.g. typed wrappers), it is dropped together with the head index.
+    """
+
+    __slots__ = (
+        "parent",
+        "_heads",
+        "memo",
+        "start",
+        "end",
+        "dirty",
+        "journal",
+        "source",
+    )
+
+    @classmethod
+    def adopt(cls, node: List, parent: "SexpList | None" = None) -> "SexpList":
+        out = node if isinstance(node, SexpList) else cls(node)
+        out.parent = parent
+        out._heads = out.memo = None
+        if not isinstance(node, SexpList):
+            out.start = out.end = -1
+            out.dirty = True
+        return out
+
+    def touch(self) -> None:
+        node = self
+        while node is not None and not node.dirty:
+            node.dirty = True
+            node = node.parent
+
+    def root(self) -> "SexpList":
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def by_head(self, head: str) -> Iterable[List]:
+        heads = self._heads
+        if heads is None and len(self) < INDEX_MIN_CHILDREN:
+            return [
+                child
+                for child in self
+                if isinstance(child, list)
+                and child
+                and type(child[0]) is Symbol
+                and str.__eq__(child[0], head)
+            ]
+        if heads is None:
+            heads = self._heads = {}
+            for child in self:
+                if isinstance(child, list) and child and type(child[0]) is Symbol:
+                    heads.setdefault(str(child[0]), {})[id(child)] = child
+        bucket = heads.get(head)
+        return bucket.values() if bucket is not None else ()
+
+    def append(self, child) -> None:
+        list.append(self, child)
+        self.memo = None
+        self.touch()
+        if isinstance(child, SexpList):
+            child.parent = self
+        heads = self._heads
+        if heads is not None and isinstance(child, list) and child:
+            if type(child[0]) is Symbol:
+                heads.setdefault(str(child[0]), {})[id(child)] = child
+
+    def discard(self) -> None:
+        """
+        Delete this node in O(1).
+        It is emptied into a [None] tombstone right away, dropped from the
+        parent index and journaled, so compact() can remove it from the parent.
+        """
+        parent = self.parent
+        heads = parent._heads if parent is not None else None
+        if heads is not None and self and type(self[0]) is Symbol:
+            heads.get(str(self[0]), {}).pop(id(self), None)
+        if parent is not None:
+            parent.memo = None
+
+        # plain list ops, the parent index is already up to date
+        list.clear(self)
+        list.append(self, None)
+        self._heads = self.memo = None
+        self.touch()
+
+        if parent is None:
+            return
+        root = parent.root()
+        journal = getattr(root, "journal", None)
+        if journal is None:
+            journal = root.journal = {}
+        journal[id(parent)] = parent
+
+    __setitem__ = _mutation(list.__setitem__)
+    __delitem__ = _mutation(list.__delitem__)
+    __iadd__ = _mutation(list.__iadd__)
+    insert = _mutation(list.insert)
+    extend = _mutation(list.extend)
+    pop = _mutation(list.pop)
+    remove = _mutation(list.remove)
+    clear = _mutation(list.clear)
+    sort = _mutation(list.sort)
+    reverse = _mutation(list.reverse)
+
+    def __reduce_ex__(self, protocol):
+        # Rebuilt by calling the class with the items, so unpickling neither
+        # goes through the overridden append/extend nor runs python code per
+        # node. The slots are restored in one pass by _restore, the parent
+        # would be a reference cycle through the constructor arguments.
+        return (SexpList, (tuple(self),))
+
+
+class LazySexpList(SexpList):
+    """
+    Node whose body is only parsed on first access.
+    Until then it only holds its head, source holds the source and
+    start/end the span of the body in it. Once parsed it turns into a plain
+    SexpList. Clean lazy nodes are dumped from the source without parsing.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_span(
+        cls, head: Symbol, source, start: int, end: int, parent: SexpList
+    ) -> "LazySexpList":
+        out = cls((head,))
+        out.parent = parent
+        out._heads = out.memo = None
+        out.start = start
+        out.end = end
+        out.dirty = False
+        out.source = source
+        return out
+
+    def _parse(self) -> None:
+        source = self.source
+        del self.source
+        with _gc_paused():
+            forms = _loads_seq(source, self.start, self.end)
+        if len(forms) != 1 or forms[0].start != self.start:
+            raise ParseError(f"Malformed lazy node at byte {self.start}")
+        node = forms[0]
+        list.__setitem__(self, slice(None), node)
+        for child in node:
+            if isinstance(child, SexpList):
+                child.parent = self
+        self.__class__ = SexpList
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __getitem__(self, key):
+        # the head is known without parsing
+        if type(key) is int and key == 0:
+            return list.__getitem__(self, 0)
+        self._parse()
+        return self[key]
+
+
+def _parsing(name: str):
+    def method(self: LazySexpList, *args, **kwargs):
+        self._parse()
+        return getattr(self, name)(*args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+def _comparing(name: str):
+    # list comparisons read the other list's items directly
+    def method(self: LazySexpList, other):
+        self._parse()
+        if type(other) is LazySexpList:
+            other._parse()
+        return getattr(self, name)(other)
+
+    method.__name__ = name
+    return method
+
+
+for _name in [
+    "__iter__",
+    "__reversed__",
+    "__len__",
+    "__contains__",
+    "__add__",
+    "__mul__",
+    "__repr__",
+    "index",
+    "count",
+    "copy",
+    "by_head",
+    "append",
+    "discard",
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "insert",
+    "extend",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+    "__reduce_ex__",
+]:
+    setattr(LazySexpList, _name, _parsing(_name))
+for _name in ["__eq__", "__ne__", "__lt__", "__le__", "__gt__", "__ge__"]:
+    setattr(LazySexpList, _name, _comparing(_name))
+
+
+def _unquote(raw: str, cls) -> str:
+    # same escape semantics as sexpdata.Parser
+    out = []
+    i = 0
+    while True:
+        j = raw.find("\\", i)
+        if j < 0 or j + 1 >= len(raw):
+            out.append(raw[i:])
+            return "".join(out)
+        out.append(raw[i:j])
+        out.append(cls.unquote(raw[j : j + 2]))
+        i = j + 2
+
+
+def _atom(token: bytes) -> Any:
+    text = token.decode("utf-8")
+    if "\\" in text:
+        text = _unquote(text, Symbol)
+    if text == "nil":
+        return []
+    if text == "t":
+        return True
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return Symbol(text)
+
+
+@contextmanager
+def _gc_paused():
+    # nothing becomes garbage while building a tree, but the cyclic gc would
+    # keep rescanning it while it grows
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def loads(buf) -> List:
+    """
+    Parse a single s-expression from a bytes-like buffer (bytes, mmap, ...).
+    Produces the same tree as sexpdata.loads with default arguments,
+    but with SexpList instead of plain lists.
+    """
+
+    with _gc_paused():
+        return _loads(buf)
+
+
+def _loads_seq(buf, pos: int = 0, endpos: Optional[int] = None) -> SexpList:
+    # all expressions in buf[pos:endpos] as children of an unspanned list,
+    # spans are relative to buf
+
+    # atoms and strings repeat a lot in board files, convert each only once
+    atoms: Dict[bytes, Any] = {}
+    strings: Dict[bytes, str] = {}
+
+    # SexpList.append does index bookkeeping which is not needed here
+    append = list.append
+    stack: List[List] = []
+    current = SexpList()
+    current.parent = None
+    current.start = current.end = -1
+    m = None
+
+    if endpos is None:
+        endpos = len(buf)
+
+    for m in _TOKEN.finditer(buf, pos, endpos):
+        kind = m.lastindex
+        if kind == 1:
+            stack.append(current)
+            child = SexpList()
+            child.parent = current
+            child._heads = child.memo = None
+            child.start = m.start(1)
+            child.dirty = False
+            current = child
+        elif kind == 2:
+            if not stack:
+                raise ParseError(f"Too many closing brackets at byte {m.start(2)}")
+            done = current
+            done.end = m.end(2)
+            current = stack.pop()
+            append(current, done)
+        elif kind == 3:
+            raw = m.group(3)
+            value = strings.get(raw)
+            if value is None:
+                value = raw.decode("utf-8")
+                if "\\" in value:
+                    value = _unquote(value, String)
+                strings[raw] = value
+            append(current, value)
+        elif kind == 4:
+            raw = m.group(4)
+            value = atoms.get(raw)
+            if value is None:
+                value = _atom(raw)
+                if value == []:
+                    # nil has to be a fresh list every time
+                    append(current, value)
+                    continue
+                atoms[raw] = value
+            append(current, value)
+        else:
+            raise ParseError(f"Unexpected character at byte {m.start(5)}")
+
+    pos = m.end() if m is not None else pos
+    if stack or _TRAILING.match(buf, pos, endpos).end() != endpos:
+        raise ParseError(f"Unexpected end of s-expression at byte {pos}")
+    return current
+
+
+def _loads(buf) -> List:
+    current = _loads_seq(buf)
+    if len(current) != 1:
+        raise ParseError(f"Expected exactly one s-expression, got {len(current)}")
+
+    root = current[0]
+    if isinstance(root, SexpList):
+        root.parent = None
+    return root
+
+
+def loads_lazy(buf, heads: Iterable[str] = ("footprint",)) -> List:
+    """
+    loads, but top level forms with one of the heads are left unparsed
+    until they are first accessed (see LazySexpList). buf has to stay
+    alive as long as the tree. Falls back to loads if buf does not have the
+    KiCad layout.
+    """
+    open_at = _TRAILING.match(buf).end()
+    close_at = len(buf) - 1
+    while close_at > open_at and buf[close_at : close_at + 1].isspace():
+        close_at -= 1
+    if buf[open_at : open_at + 1] != b"(" or buf[close_at : close_at + 1] != b")":
+        return loads(buf)
+
+    prefixes = tuple(f"({head}".encode() for head in heads)
+    starts = [m.end() for m in _TOP_LEVEL.finditer(buf, open_at + 1, close_at)]
+
+    root = SexpList()
+    root.parent = None
+    root._heads = root.memo = None
+    root.start = open_at
+    root.end = close_at + 1
+    root.dirty = False
+
+    with _gc_paused():
+        try:
+            eager_from = open_at + 1
+            for start, next_start in zip(starts, starts[1:] + [close_at]):
+                lazy = buf[start : start + 64].startswith(prefixes)
+                if lazy:
+                    head = _TOKEN.match(buf, start + 1).group(4)
+                    lazy = head.decode() in heads
+                if not lazy:
+                    continue
+                list.extend(root, _loads_seq(buf, eager_from, start))
+                end = buf.rfind(b")", start, next_start) + 1
+                node = LazySexpList.from_span(_atom(head), buf, start, end, root)
+                list.append(root, node)
+                eager_from = end
+            list.extend(root, _loads_seq(buf, eager_from, close_at))
+        except ParseError as e:
+            logger.debug(f"Lazy parse failed, parsing eagerly: {e}")
+            return loads(buf)
+
+    for child in root:
+        if isinstance(child, SexpList):
+            child.parent = root
+    return root
+
+
+def map_file(path: Path) -> mmap.mmap:
+    with path.open("rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load(path: Path) -> List:
+    with map_file(path) as buf:
+        return loads(buf)
+
+
+# head, optionally followed by [first argument]
+_STEP = re.compile(r'([^/\[\]"\s]+)(?:\[("(?:[^"\\]|\\.)*"|[^\]"]*)\])?(?:/|$)')
+
+
+class Step(NamedTuple):
+    head: str
+    # [first argument] to match node[1:2] against, None matches any
+    arg: Optional[List]
+
+
+@lru_cache(maxsize=1024)
+def compile_selector(path: str) -> Tuple[Step, ...]:
+    """
+    Compile a selector like footprint/fp_text[reference].
+    Each step selects the children with that head, [x] additionally requires
+    their first argument to be x, written like in the file, e.g. pad["1"].
+    """
+    steps = []
+    pos = 0
+    while pos < len(path):
+        m = _STEP.match(path, pos)
+        if m is None or m.end() == pos:
+            raise ValueError(f"Invalid selector {path!r} at {pos}")
+        head, arg = m.groups()
+        steps.append(Step(head, None if arg is None else [_loads(arg.encode())]))
+        pos = m.end()
+    if not steps or path.endswith("/"):
+        raise ValueError(f"Invalid selector {path!r}")
+    return tuple(steps)
+
+
+# bump when the pickled tree layout changes
+CACHE_VERSION = 1
+
+
+def _walk(root: SexpList) -> Iterable[SexpList]:
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(child for child in node if type(child) is SexpList)
+
+
+def _spans(root: SexpList) -> array:
+    out = array("q")
+    for node in _walk(root):
+        out.append(node.start)
+        out.append(node.end)
+    return out
+
+
+def _restore(root: SexpList, spans: array) -> None:
+    # same order as _walk, inlined since it runs for every node
+    root.parent = None
+    it = iter(spans)
+    stack = [root]
+    push = stack.append
+    pop = stack.pop
+    while stack:
+        node = pop()
+        node.start = next(it)
+        node.end = next(it)
+        node.dirty = False
+        node._heads = node.memo = None
+        for child in node:
+            if type(child) is SexpList:
+                child.parent = node
+                push(child)
+
+
+def _parse_chunk(chunk: bytes, offset: int) -> Tuple[SexpList, array]:
+    # runs in a worker, the tree is sent back like in the parse cache
+    with _gc_paused():
+        forms = _loads_seq(chunk)
+        spans = array("q", (x + offset for x in _spans(forms)))
+    return forms, spans
+
+
+def _split(buf, chunks: int) -> List[Tuple[int, int]]:
+    # byte ranges of about the same size inside the root list,
+    # cut only in front of top level forms
+    start = _TRAILING.match(buf).end() + 1
+    end = len(buf) - 1
+    while end > start and buf[end : end + 1].isspace():
+        end -= 1
+    target = (end - start) // chunks
+    cuts = [start]
+    for m in _TOP_LEVEL.finditer(buf, start, end):
+        if m.start() - cuts[-1] >= target:
+            cuts.append(m.start())
+    return list(zip(cuts, cuts[1:] + [end]))
+
+
+def worker_count(workers: Optional[int] = None) -> int:
+    """
+    Processes loads_parallel uses for workers (all cores by default), capped
+    at the number of cores: more only adds pickling overhead.
+    """
+    cores = os.cpu_count() or 1
+    return min(workers or cores, cores)
+
+
+def loads_parallel(
+    buf, workers: Optional[int] = None, min_chunk_size: int = 1024 * 1024
+) -> List:
+    """
+    loads, with the top level forms of the root list parsed in a process
+    pool. Gives the same tree (and spans) as loads, falls back to it for
+    small buffers and ones the KiCad layout based split does not work for.
+    workers is capped by worker_count, with a warning.
+    """
+    used = worker_count(workers)
+    if workers is not None and used < workers:
+        logger.warning(f"Using {used} of {workers} workers, only {used} cores")
+    workers = used
+    chunks = min(workers * 4, len(buf) // min_chunk_size)
+    if workers < 2 or chunks < 2:
+        return loads(buf)
+
+    ranges = _split(buf, chunks)
+    open_at = ranges[0][0] - 1
+    close_at = ranges[-1][1]
+    if (
+        len(ranges) < 2
+        or buf[open_at : open_at + 1] != b"("
+        or buf[close_at : close_at + 1] != b")"
+    ):
+        return loads(buf)
+
+    try:
+        with _gc_paused(), ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(
+                pool.map(
+                    _parse_chunk,
+                    (bytes(buf[s:e]) for s, e in ranges),
+                    (s for s, _ in ranges),
+                )
+            )
+    except ParseError as e:
+        # e.g. a string spanning a cut, let the serial parser decide
+        logger.debug(f"Parallel parse failed, parsing serially: {e}")
+        return loads(buf)
+
+    with _gc_paused():
+        root = SexpList()
+        for forms, spans in parts:
+            _restore(forms, spans)
+            list.extend(root, forms)
+        root.parent = None
+        root._heads = root.memo = None
+        root.start = open_at
+        root.end = close_at + 1
+        root.dirty = False
+        for child in root:
+            if type(child) is SexpList:
+                child.parent = root
+    return root
+
+
+def _evict(cache_dir: Path, max_size: int) -> None:
+    entries = sorted(
+        ((p.stat(), p) for p in cache_dir.glob("*.pickle")),
+        key=lambda e: e[0].st_mtime,
+        reverse=True,
+    )
+    size = 0
+    for st, p in entries:
+        size += st.st_size
+        if size > max_size:
+            logger.debug(f"Evicting {p} from parse cache")
+            p.unlink(missing_ok=True)
+
+
+def loads_cached(
+    buf, cache_dir: Path, max_size: int = 256 * 1024 * 1024, workers: int = 1
+) -> List:
+    """
+    loads, but keeps the parsed tree in cache_dir keyed by the content hash
+    of buf. Least recently used entries are evicted above max_size bytes.
+    Misses are parsed with loads_parallel if workers > 1.
+    """
+    digest = hashlib.blake2b(buf, digest_size=16).hexdigest()
+    cache_path = cache_dir.joinpath(f"{digest}.v{CACHE_VERSION}.pickle")
+
+    if cache_path.exists():
+        try:
+            with _gc_paused(), cache_path.open("rb") as f:
+                tree, spans = pickle.load(f)
+                _restore(tree, spans)
+            os.utime(cache_path)
+            return tree
+        except Exception as e:
+            logger.warning(f"Ignoring broken parse cache {cache_path}: {e}")
+
+    tree = loads_parallel(buf, workers) if workers > 1 else loads(buf)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    with _gc_paused(), tmp_path.open("wb") as f:
+        pickle.dump((tree, _spans(tree)), f, protocol=5)
+    os.replace(tmp_path, cache_path)
+    _evict(cache_dir, max_size)
+
+    return tree
+
+
+def _is_tombstone(x) -> bool:
+    return type(x) is SexpList and len(x) == 1 and x[0] is None
+
+
+def compact(root: SexpList) -> None:
+    """
+    Remove the tombstones of deleted nodes.
+    Only visits the parents that had deletions since the last compaction.
+    """
+    journal = getattr(root, "journal", None)
+    if not journal:
+        return
+    for parent in journal.values():
+        # plain list op, neither the index nor the dirty state change
+        list.__setitem__(
+            parent, slice(None), [x for x in parent if not _is_tombstone(x)]
+        )
+    journal.clear()
+
+
+def find_children(root: SexpList, source, needle: bytes | re.Pattern) -> List[SexpList]:
+    """
+    Children of root whose source span contains needle, bytes or a compiled
+    bytes pattern.
+    Searches the bytes of source and bisects the spans of the children, so
+    children without needle cost nothing. Children appended after parsing
+    have no span and are not found, edited ones by what they were parsed
+    from.
+    """
+    if isinstance(needle, re.Pattern):
+
+        def find(pos: int) -> int:
+            match = needle.search(source, pos)
+            return -1 if match is None else match.start()
+
+    else:
+
+        def find(pos: int) -> int:
+            return source.find(needle, pos)
+
+    # children with spans are in source order, appended ones come after them
+    lo, hi = 0, len(root)
+    while lo < hi and not _has_span(root[lo], source):
+        lo += 1
+    while hi > lo and not _has_span(root[hi - 1], source):
+        hi -= 1
+
+    out = []
+    pos = find(0)
+    while pos != -1:
+        i = bisect.bisect_right(root, pos, lo, hi, key=lambda x: x.start) - 1
+        child = root[i] if i >= lo else None
+        if child is None or pos >= child.end:
+            pos = find(pos + 1)
+            continue
+        if not _is_tombstone(child):
+            out.append(child)
+        pos = find(child.end)
+    return out
+
+
+def _is_empty(x) -> bool:
+    # deleted nodes are [None] tombstones, lazy nodes always have a head
+    if type(x) is LazySexpList:
+        return False
+    return x is None or (
+        isinstance(x, (list, tuple)) and all(_is_empty(sub) for sub in x)
+    )
+
+
+def _has_span(x, source) -> bool:
+    return source is not None and isinstance(x, SexpList) and x.start >= 0
+
+
+def _whitespace_before(source, pos: int) -> bytes:
+    start = pos
+    while start > 0 and source[start - 1 : start].isspace():
+        start -= 1
+    return source[start:pos]
+
+
+# verbatim copies are written in pieces of at most this size
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _copy(source, start: int, end: int) -> Iterator[bytes]:
+    for pos in range(start, end, COPY_CHUNK_SIZE):
+        yield source[pos : min(pos + COPY_CHUNK_SIZE, end)]
+
+
+def _format_atom(x) -> bytes:
+    if type(x) is float:
+        # like KiCad: fixed point, at most 6 decimals, no trailing zeros
+        out = f"{x:.6f}".rstrip("0").rstrip(".")
+        return b"0" if out == "-0" else out.encode()
+    return tosexp(x).encode("utf-8")
+
+
+def _emit(x, source) -> Iterator[bytes]:
+    if not isinstance(x, (list, tuple)):
+        yield _format_atom(x)
+        return
+
+    if _has_span(x, source) and not x.dirty:
+        yield from _copy(source, x.start, x.end)
+        return
+
+    items = [item for item in x if not _is_empty(item)]
+    spanned = _has_span(x, source)
+
+    # new children go on their own line if this node's children already do
+    new_child_sep = b" "
+    if spanned:
+        for item in reversed(items):
+            if _has_span(item, source):
+                sep = _whitespace_before(source, item.start)
+                if b"\n" in sep:
+                    new_child_sep = sep
+                break
+
+    yield b"("
+    for i, item in enumerate(items):
+        if i > 0:
+            if _has_span(item, source):
+                yield _whitespace_before(source, item.start) or b" "
+            elif isinstance(item, (list, tuple)):
+                yield new_child_sep
+            else:
+                yield b" "
+        yield from _emit(item, source)
+    if spanned:
+        yield _whitespace_before(source, x.end - 1)
+    yield b")"
+
+
+def iterdump(node: List, source=None) -> Iterator[bytes]:
+    """
+    Serialize a tree chunk by chunk, dropping deleted/empty nodes like
+    sexpdata.dumps would. If the tree was parsed from source, unchanged nodes
+    are copied from it verbatim and changed ones keep the formatting around
+    them. New floats are formatted like KiCad does.
+    """
+    if _has_span(node, source):
+        yield from _copy(source, 0, node.start)
+        yield from _emit(node, source)
+        yield from _copy(source, node.end, len(source))
+    else:
+        yield from _emit(node, source)
+
+
+def dumps(node: List, source=None) -> bytes:
+    return b"".join(iterdump(node, source))
+
+
+def dump(node: List, path: Path, source=None, buffer_size: int = 1024 * 1024) -> int:
+    """
+    Stream the serialized tree into path through a temporary file, which
+    replaces path only once it is complete. source may be mapped from path.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    written = 0
+    try:
+        with tmp_path.open("wb", buffering=buffer_size) as f:
+            for chunk in iterdump(node, source):
+                written += f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return written
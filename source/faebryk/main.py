@@ -2,6 +2,7 @@
 TODO: Explain file
 """
 
+import gc
 import logging
 import subprocess
 from pathlib import Path
@@ -22,9 +23,11 @@ from faebryk.exporters.netlist.kicad.netlist_kicad import from_faebryk_t2_netlis
 from faebryk.exporters.netlist.netlist import make_t2_netlist_from_t1
 from faebryk.library.core import Component
 from faebryk.library.util import get_all_components
-from library.kicadpcb import PCB, At
+from library import drc
+from library.kicadpcb import PCB
 from library.library.components import MOSFET
-from library.pcbutil import PCB_Transformer
+from library.pcbdiff import diff
+from library.pcbutil import PCB_Transformer, RowPacker
 
 # logging settings
 logger = logging.getLogger(__name__)
@@ -96,10 +99,22 @@ def transform_pcb(transformer: PCB_Transformer):
         (t.vbus[3], t.gnd[3]),
         (None, t.shield),
     ]
-    base = (13, 2.5)
-    for i, (l, r) in enumerate(matrix):
+    # left, up, right, down
+    # rows are 3.25 apart, the mosfets are the highest parts of a row
+    packer = RowPacker(
+        clearances={
+            LED_FP: (2.25, 1, 2, 1),
+            RESISTOR_FP: (1, 0.5, 1, 0.5),
+            MOSFET_FPS[0]: (2, 1.625, 2, 1.625),
+            MOSFET_FPS[1]: (2, 1.625, 2, 1.625),
+        }
+    )
+    groups: List[Optional[List[Tuple[Component, int]]]] = []
+    mosfets: List[Tuple[MOSFET, PairTester]] = []
+    for l, r in matrix:
         for j, x in enumerate([l, r]):
             if x is None:
+                groups.append(None)
                 continue
             flip = j == 1
             alt = x in t.gnd + [t.shield]
@@ -121,85 +136,44 @@ def transform_pcb(transformer: PCB_Transformer):
             if flip:
                 layout = PCB_Transformer.flipped(layout)
 
-            # left, up, right, down
-            clearances = {
-                LED_FP: (2.25, 1, 2, 1),
-                RESISTOR_FP: (1, 0.5, 1, 0.5),
-                MOSFET_FPS[0]: (2, 3.25, 2, 3.25),
-                MOSFET_FPS[1]: (2, 3.25, 2, 3.25),
-            }
-
-            group_x_ptr = 0
-            for j2, (cmp, rot) in enumerate(layout):
-                fp = PCB_Transformer.get_fp(cmp)
-                clearance = clearances.get(fp.name, tuple([3] * 4))
-                # rotate
-                clearance = tuple(clearance[rot // 90 :] + clearance[: rot // 90])
-
-                group_x_ptr += clearance[0]
-
-                target = (
-                    base[0] + j * 11 + group_x_ptr,  # x row length
-                    base[1] + i * 3.25,  # y mosfet clearance
-                    rot,
-                )
-                transformer.move_fp(fp, target)
-                group_x_ptr += clearance[2]
-
-                # mosfet vias
-                if PLACE_VIAS:
-                    if isinstance(cmp, MOSFET):
-                        # source via to power plane
-                        if ind.power_switch.lowside:
-                            transformer.insert_via_next_to(
-                                intf=cmp.IFs.drain, clearance=(-1.5, 0)
-                            )
-                        # gate via to signal plane
-                        transformer.insert_via_next_to(
-                            intf=cmp.IFs.gate, clearance=(1.5, 0.5)
-                        )
+            groups.append(layout)
+            mosfets.append((mos, x))
+
+    # two columns 11 apart starting at x=13, first row at y=2.5
+    transformer.pack(
+        groups, packer, bounds=(13, 0.875, 50, 50), per_line=2, gap=(0.75, 0)
+    )
+
+    # mosfet vias, next to the moved pads
+    if PLACE_VIAS:
+        for mos, x in mosfets:
+            # source via to power plane
+            if x.CMPs.indicator.CMPs.power_switch.lowside:
+                transformer.insert_via_next_to(intf=mos.IFs.drain, clearance=(-1.5, 0))
+            # gate via to signal plane
+            transformer.insert_via_next_to(intf=mos.IFs.gate, clearance=(1.5, 0.5))
 
     # Done, and moved manually, so disabling now
     # USB VIA
     # usb_pm = t.usb_c[1].get_trait(has_footprint_pinmap).get_pin_map()
-    # for side in ["A", "B"]:
-    #    intfs = [usb_pm[f"{side}{i}"] for i in range(1, 13)]
-    #    if side == "B":
-    #        transformer.insert_via_triangle(
-    #            intfs,
-    #            depth=5 if side == "A" else -5.5,
-    #            clearance=0.75 if side == "A" else -0.75,
-    #        )
-    #    if side == "A":
-    #        transformer.insert_via_line2(intfs[:6], (6, 0), (0, -0.75))
-    #        transformer.insert_via_line2(list(reversed(intfs[6:])), (6, 0), (0, -0.75))
+    # intfs = [usb_pm[f"{side}{i}"] for side in ["A", "B"] for i in range(1, 13)]
+    # transformer.fanout(intfs, clearance=0.2)
 
     # --------------------------------------------------------------------------
-    def place_label(cmp: PairTester):
-        fp = PCB_Transformer.get_fp(cmp.CMPs.indicator.CMPs.led.CMPs.led)
-        assert len(fp.at.coord) == 3
-        assert cmp.parent is not None
-        name = cmp.parent[1]
-        # TODO move a bit
-        c = fp.at.coord
-        at = At.factory(
-            (
-                c[0],
-                c[1] - 1.5,
-                0,
-            )
-        )
-
-        transformer.insert_text(
-            text=name, at=at, font=(1 / 4, 1 / 4, 0.15 / 4), permanent=True
-        )
-
+    # channel names next to the leds, above them if there is room
+    labels: List[Tuple[str, Component]] = []
     for cmp in t.get_all():
-        if isinstance(cmp, list):
-            for cmp_ in cmp:
-                place_label(cmp_)
-        if isinstance(cmp, PairTester):
-            place_label(cmp)
+        for cmp_ in cmp if isinstance(cmp, list) else [cmp]:
+            if not isinstance(cmp_, PairTester):
+                continue
+            assert cmp_.parent is not None
+            labels.append((cmp_.parent[1], cmp_.CMPs.indicator.CMPs.led.CMPs.led))
+    transformer.place_labels(
+        labels,
+        offsets=[(0, -1.5), (0, -1.25), (0, -1.75), (0, 1.5), (0, 1.25), (0, 1.75)],
+        font=(1 / 4, 1 / 4, 0.15 / 4),
+        permanent=True,
+    )
 
     # --------------------------------------------------------------------------
     # rename, resize, relayer text
@@ -257,15 +231,28 @@ def main(nonetlist: bool = False, nopcb: bool = False):
     if nopcb:
         return
 
-    pcb = PCB.load(pcbfile)
+    cache_dir = build_dir.joinpath("cache/kicadpcb")
+    pcb = PCB.load(pcbfile, cache_dir=cache_dir)
+    # the board lives until the end, keep the gc from rescanning it
+    gc.freeze()
 
     transformer = PCB_Transformer(pcb, G)
+    ratsnest = transformer.ratsnest()
+    before = ratsnest.total()
 
     transform_pcb(transformer)
+    logger.info(f"Ratsnest {before:.2f} -> {ratsnest.total():.2f} mm")
+    drc.report(drc.check(pcb, index=transformer.spatial, nets=transformer.nets))
 
     # import pprint
     # pprint.pprint(pcb.node)
-    logger.info(f"Writing pcbfile {pcbfile}")
+    changes = diff(PCB.load(pcbfile, cache_dir=cache_dir), pcb)
+    if not changes:
+        logger.info(f"No changes to {pcbfile}")
+        return
+    for change in changes:
+        logger.debug(change)
+    logger.info(f"Writing pcbfile {pcbfile} ({len(changes)} changes)")
     pcb.dump(pcbfile)
 
     # pcbnew()
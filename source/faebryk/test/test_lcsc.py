@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("faebryk")
+easyeda_api = pytest.importorskip("easyeda2kicad.easyeda.easyeda_api")
+
+from library import lcsc  # noqa: E402
+
+BAD = "C0"
+
+
+class _Server(ThreadingHTTPServer):
+    # stand-in for the easyeda api: /api/products/<partno>/components
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        self.hits: Counter = Counter()
+        self.active = 0
+        self.peak = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _Server
+
+    def do_GET(self):
+        partno = self.path.split("/")[3]
+        server = self.server
+        with server.lock:
+            server.hits[partno] += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        # long enough for the requests of a pool to overlap
+        time.sleep(0.05)
+        with server.lock:
+            server.active -= 1
+
+        if partno == BAD:
+            self.send_error(500)
+            return
+        body = json.dumps({"success": True, "result": {"partno": partno}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    server = _Server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    monkeypatch.setattr(
+        easyeda_api,
+        "API_ENDPOINT",
+        f"http://{host}:{port}/api/products/{{lcsc_id}}/components",
+    )
+    monkeypatch.setattr(lcsc, "CACHE_BASE", tmp_path.joinpath("easyeda"))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+PARTS = [f"C{i}" for i in range(1, 11)]
+
+
+def test_prefetch_downloads_each_part_once(server: _Server):
+    failed = lcsc.prefetch(PARTS + PARTS[:4] + PARTS[::-1], workers=3)
+
+    assert failed == []
+    assert server.hits == Counter({partno: 1 for partno in PARTS})
+    assert 1 <= server.peak <= 3
+    for partno in PARTS:
+        data = json.loads(lcsc.CACHE_BASE.joinpath(partno).read_text())
+        assert data == {"partno": partno}
+
+
+def test_prefetch_cached_makes_no_requests(server: _Server):
+    lcsc.prefetch(PARTS, workers=3)
+    server.hits.clear()
+
+    assert lcsc.prefetch(PARTS, workers=3) == []
+    assert not server.hits
+
+
+def test_prefetch_returns_failures(server: _Server):
+    failed = lcsc.prefetch(PARTS[:3] + [BAD, BAD], workers=2)
+
+    assert failed == [BAD]
+    assert server.hits[BAD] == 1
+    # failures are not cached, the next attempt asks again
+    assert not lcsc.CACHE_BASE.joinpath(BAD).exists()
+    assert lcsc.prefetch([BAD]) == [BAD]
+    assert server.hits[BAD] == 2
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import pytest
+from library.kicadpcb import PCB, At, FP_Text
+from library.pcbdiff import diff
+from sexpdata import Symbol
+
+BOARD = Path(__file__).parent.parent.parent.joinpath("kicad/main/main.kicad_pcb")
+
+
+@pytest.fixture
+def boards():
+    return PCB.load(BOARD), PCB.load(BOARD)
+
+
+def _user_text(text: str) -> FP_Text:
+    return FP_Text.factory(
+        text=text,
+        at=At.factory((0, 0, 0)),
+        layer="User.5",
+        font=(1, 1, 0.125),
+        tstamp="12345678-1234-1234-1234-123456789abc",
+    )
+
+
+def test_unchanged(boards):
+    old, new = boards
+    assert diff(old, new) == []
+
+
+@pytest.mark.parametrize(
+    "edit",
+    [[Symbol("hide")], [[Symbol("justify"), Symbol("left")]]],
+    ids=["hide", "justify"],
+)
+def test_fp_text_effects(boards, edit):
+    old, new = boards
+    effects = new.footprints[0].reference.select("effects")[0]
+    for x in edit:
+        effects.node.append(x)
+
+    changes = diff(old, new)
+    assert [c.action for c in changes] == ["edited"]
+
+
+def test_identical_user_texts(boards):
+    old, new = boards
+    old.footprints[0].append(_user_text("twice"))
+    new.footprints[0].append(_user_text("twice"))
+    new.footprints[0].append(_user_text("twice"))
+
+    changes = diff(old, new)
+    assert [(c.kind, c.action, c.new) for c in changes] == [
+        ("fp_text", "added", "twice")
+    ]
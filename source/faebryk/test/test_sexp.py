@@ -0,0 +1,134 @@
+import os
+from pathlib import Path
+from typing import List
+
+import pytest
+import sexpdata
+from library import sexp
+from library.kicadpcb import PCB, At, GR_Text
+from sexpdata import Symbol
+
+BOARD = Path(__file__).parent.parent.parent.joinpath("kicad/main/main.kicad_pcb")
+
+
+def _dumps_sexpdata(node) -> str:
+    # PCB.dump before the incremental serializer
+    def remove_empty(x):
+        if isinstance(x, (list, tuple)):
+            rec = map(remove_empty, x)
+            return [o for o in rec if (o is not None) and (o not in [[], tuple()])]
+        return x
+
+    return sexpdata.dumps(remove_empty(node))
+
+
+@pytest.fixture
+def pcb() -> PCB:
+    return PCB.load(BOARD)
+
+
+def test_loads_like_sexpdata():
+    expected = sexpdata.loads(BOARD.read_text(encoding="utf-8"))
+    assert sexp.loads(sexp.map_file(BOARD)) == expected
+
+
+def test_unchanged_dump_is_identical(pcb: PCB, tmp_path: Path):
+    out = tmp_path.joinpath("out.kicad_pcb")
+    pcb.dump(out)
+    assert out.read_bytes() == BOARD.read_bytes()
+
+
+def test_edited_dump_like_sexpdata(pcb: PCB, tmp_path: Path):
+    fp = pcb.footprints[0]
+    x, y, rot = fp.at.coord
+    fp.at.coord = (x + 1.125, y - 1.125, rot)
+    pcb.vias[0].delete()
+    pcb.append(
+        GR_Text.factory(
+            text="test",
+            at=At.factory((1.125, 2.125, 0)),
+            layer="F.SilkS",
+            font=(1, 1, 0.125),
+            tstamp="12345678-1234-1234-1234-123456789abc",
+        )
+    )
+    expected = sexpdata.loads(_dumps_sexpdata(pcb.node))
+
+    out = tmp_path.joinpath("out.kicad_pcb")
+    pcb.dump(out)
+    assert sexpdata.loads(out.read_text(encoding="utf-8")) == expected
+
+
+def test_lazy_loads_like_loads():
+    source = sexp.map_file(BOARD)
+    assert sexp.loads_lazy(source) == sexp.loads(source)
+
+
+def test_lazy_dump_keeps_untouched_footprints(tmp_path: Path):
+    eager, lazy = PCB.load(BOARD), PCB.load(BOARD, lazy=True)
+    for pcb in (eager, lazy):
+        pcb.vias[0].delete()
+    eager.dump(tmp_path.joinpath("eager.kicad_pcb"))
+    lazy.dump(tmp_path.joinpath("lazy.kicad_pcb"))
+
+    assert all(type(fp) is sexp.LazySexpList for fp in lazy.node.by_head("footprint"))
+    assert (
+        tmp_path.joinpath("lazy.kicad_pcb").read_bytes()
+        == tmp_path.joinpath("eager.kicad_pcb").read_bytes()
+    )
+
+
+def _cache_entries(cache_dir: Path) -> List[Path]:
+    return sorted(cache_dir.glob("*.pickle"))
+
+
+def test_cached_hit_skips_parsing(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    source = BOARD.read_bytes()
+    tree = sexp.loads_cached(source, tmp_path)
+    assert len(_cache_entries(tmp_path)) == 1
+
+    def fail(buf):
+        raise AssertionError("parsed despite cache hit")
+
+    monkeypatch.setattr(sexp, "loads", fail)
+    cached = sexp.loads_cached(source, tmp_path)
+    assert cached == tree
+    assert sexp._spans(cached) == sexp._spans(tree)
+
+
+def test_cached_invalidated_by_content(tmp_path: Path):
+    assert sexp.loads_cached(b"(a 1)", tmp_path) == [Symbol("a"), 1]
+    assert sexp.loads_cached(b"(a 2)", tmp_path) == [Symbol("a"), 2]
+    assert len(_cache_entries(tmp_path)) == 2
+
+
+def test_cached_evicts_least_recently_used(tmp_path: Path):
+    sexp.loads_cached(b"(a 1)", tmp_path)
+    first = _cache_entries(tmp_path)[0]
+    sexp.loads_cached(b"(a 2)", tmp_path)
+    (second,) = set(_cache_entries(tmp_path)) - {first}
+    os.utime(first, (1000, 1000))
+    os.utime(second, (2000, 2000))
+
+    # the hit makes the first one the most recently used
+    sexp.loads_cached(b"(a 1)", tmp_path)
+    max_size = 2 * first.stat().st_size
+    sexp.loads_cached(b"(a 3)", tmp_path, max_size=max_size)
+
+    entries = _cache_entries(tmp_path)
+    assert first in entries and second not in entries
+    assert len(entries) == 2
+
+
+def test_parallel_like_loads(monkeypatch: pytest.MonkeyPatch):
+    source = BOARD.read_bytes()
+    expected = sexp.loads(source)
+
+    def fail(buf):
+        raise AssertionError("parsed serially")
+
+    monkeypatch.setattr(sexp.os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(sexp, "loads", fail)
+    tree = sexp.loads_parallel(source, workers=4, min_chunk_size=64 * 1024)
+    assert tree == expected
+    assert sexp._spans(tree) == sexp._spans(expected)